@@ -0,0 +1,224 @@
+import fcntl
+import hashlib
+import ipaddress
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+
+# Контроль допуску: під навантаженням запит отримує швидкий 429/503 з Retry-After,
+# а не чекає в черзі на потоки воркера чи блокування запису SQLite.
+#   1. Смуга для health/status: вони не проходять жодних перевірок, а решта запитів під gunicorn
+#      займає не більше ADMISSION_MAX_INFLIGHT потоків воркера (за замовчуванням threads - 1),
+#      тож один потік завжди вільний.
+#   2. Час у черзі: якщо nginx передав X-Request-Start і запит чекав довше за ADMISSION_MAX_QUEUE_MS,
+#      відповідь клієнтові вже запізнилась — 503 без виконання.
+#   3. Token bucket на клієнта (429) та глобальний (503) для /api/v1/* і записів;
+#      стан спільний для всіх воркерів — mmap-файл під fcntl-блокуванням.
+#   4. Обмеження одночасних записів на кожен маршрут (503, якщо місце не звільнилось за ADMISSION_WRITE_WAIT_MS).
+ADMISSION = os.environ.get('ADMISSION', '1') == '1'
+ADMISSION_FILE = os.environ.get('ADMISSION_FILE', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'stardew-admission.bin'))
+ADMISSION_SLOTS = int(os.environ.get('ADMISSION_SLOTS', 4096))
+# Запитів за секунду та розмір сплеску; 0 — без обмеження
+ADMISSION_CLIENT_RATE = float(os.environ.get('ADMISSION_CLIENT_RATE', 20))
+ADMISSION_CLIENT_BURST = float(os.environ.get('ADMISSION_CLIENT_BURST', 40))
+ADMISSION_GLOBAL_RATE = float(os.environ.get('ADMISSION_GLOBAL_RATE', 0))
+ADMISSION_GLOBAL_BURST = float(os.environ.get('ADMISSION_GLOBAL_BURST', 200))
+# Заголовок з адресою клієнта від проксі (nginx ставить X-Real-IP); порожнє — REMOTE_ADDR.
+# Клієнт може підробити заголовок, тож він береться лише від ADMISSION_TRUSTED_PROXIES (IP або мережі через кому);
+# без них заголовок ігнорується
+ADMISSION_CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER', '')
+ADMISSION_TRUSTED_PROXIES = tuple(ipaddress.ip_network(value.strip(), strict=False)
+                                  for value in os.environ.get('ADMISSION_TRUSTED_PROXIES', '').split(',') if value.strip())
+ADMISSION_WRITE_CONCURRENCY = int(os.environ.get('ADMISSION_WRITE_CONCURRENCY', 2))
+ADMISSION_WRITE_WAIT_MS = float(os.environ.get('ADMISSION_WRITE_WAIT_MS', 100))
+# 0 — кількість потоків воркера gunicorn мінус один (див. reserve_lane)
+ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', 0))
+ADMISSION_INFLIGHT_WAIT_MS = float(os.environ.get('ADMISSION_INFLIGHT_WAIT_MS', 50))
+ADMISSION_MAX_QUEUE_MS = float(os.environ.get('ADMISSION_MAX_QUEUE_MS', 1000))
+
+RESERVED_ENDPOINTS = {'api.get_health', 'api.get_status'}
+# Вхід і реєстрація мають власну чергу в hashing.py
+WRITE_EXEMPT = {'login', 'register'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Слот: (хеш ключа, токени, час останнього оновлення); слот 0 — глобальний bucket
+SLOT = struct.Struct('<Qdd')
+PROBE = 8
+GLOBAL_KEY = 1
+
+class SharedBuckets:
+    """Token bucket'и в mmap-файлі: одна таблиця на всі процеси-воркери одного хоста."""
+
+    def __init__(self, path=ADMISSION_FILE, slots=ADMISSION_SLOTS):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        # Після fork потрібен власний дескриптор: flock спільного дескриптора не розділяє процеси
+        self._pid = os.getpid()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.slots * SLOT.size
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+
+    @contextmanager
+    def _locked(self):
+        # flock не розділяє потоки одного процесу — спершу звичайний Lock
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, key_hash):
+        """Індекс слота ключа; новий ключ займає порожній або найдавніше оновлений слот."""
+        start = key_hash % (self.slots - 1)
+        oldest, oldest_time = None, None
+        for i in range(PROBE):
+            index = 1 + (start + i) % (self.slots - 1)
+            stored, _, updated = SLOT.unpack_from(self._map, index * SLOT.size)
+            if stored in (key_hash, 0):
+                return index, stored == key_hash
+            if oldest is None or updated < oldest_time:
+                oldest, oldest_time = index, updated
+        return oldest, False
+
+    def take(self, key, rate, burst):
+        """Знімає токен; 0 — дозволено, інакше скільки секунд чекати на наступний токен."""
+        key_hash = GLOBAL_KEY if key is None else int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') | 1
+        now = time.time()
+        with self._locked():
+            index, found = (0, True) if key is None else self._find(key_hash)
+            stored, tokens, updated = SLOT.unpack_from(self._map, index * SLOT.size)
+            if not found or stored != key_hash:
+                tokens, updated = burst, now
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            SLOT.pack_into(self._map, index * SLOT.size, key_hash, tokens, now)
+        return wait
+
+class Shed(Exception):
+    def __init__(self, status, reason, retry_after=1):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+buckets = SharedBuckets()
+_inflight = None
+_inflight_limit = None
+_write_limits = {}
+_limits_lock = threading.Lock()
+_shed = {}
+
+def _write_semaphore(endpoint):
+    semaphore = _write_limits.get(endpoint)
+    if semaphore is None:
+        with _limits_lock:
+            semaphore = _write_limits.setdefault(endpoint, threading.BoundedSemaphore(ADMISSION_WRITE_CONCURRENCY))
+    return semaphore
+
+def _trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in ADMISSION_TRUSTED_PROXIES)
+
+def client_key():
+    remote = request.remote_addr or '-'
+    if ADMISSION_CLIENT_HEADER and _trusted_proxy(remote):
+        forwarded = request.headers.get(ADMISSION_CLIENT_HEADER)
+        if forwarded:
+            return forwarded.strip()
+    return remote
+
+def queue_seconds():
+    """Скільки запит чекав до воркера за X-Request-Start ("t=<секунди>.<мс>" від nginx) або None."""
+    value = request.headers.get('X-Request-Start', '').removeprefix('t=')
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    # Деякі проксі пишуть мілі- або мікросекунди
+    while started > 1e11:
+        started /= 1000
+    return max(0.0, time.time() - started)
+
+def _admit():
+    endpoint = request.endpoint
+    if endpoint in RESERVED_ENDPOINTS:
+        return
+    waited = queue_seconds()
+    if waited is not None and waited * 1000 > ADMISSION_MAX_QUEUE_MS:
+        raise Shed(503, 'queue')
+    g._admission_release = []
+    if _inflight is not None:
+        if not _inflight.acquire(timeout=ADMISSION_INFLIGHT_WAIT_MS / 1000):
+            raise Shed(503, 'inflight')
+        g._admission_release.append(_inflight)
+    write = request.method not in SAFE_METHODS and endpoint not in WRITE_EXEMPT
+    if not (write or request.blueprint == 'api'):
+        return
+    if ADMISSION_CLIENT_RATE:
+        wait = buckets.take(client_key(), ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST)
+        if wait:
+            raise Shed(429, 'client', wait)
+    if ADMISSION_GLOBAL_RATE:
+        wait = buckets.take(None, ADMISSION_GLOBAL_RATE, ADMISSION_GLOBAL_BURST)
+        if wait:
+            raise Shed(503, 'global', wait)
+    if write and endpoint:
+        semaphore = _write_semaphore(endpoint)
+        if not semaphore.acquire(timeout=ADMISSION_WRITE_WAIT_MS / 1000):
+            raise Shed(503, 'write')
+        g._admission_release.append(semaphore)
+
+def _before_request():
+    try:
+        _admit()
+    except Shed as e:
+        _shed[e.reason] = _shed.get(e.reason, 0) + 1
+        message = 'Забагато запитів, спробуйте пізніше.' if e.status == 429 else 'Сервер перевантажений, спробуйте пізніше.'
+        return message, e.status, {'Retry-After': str(e.retry_after), 'Content-Type': 'text/plain; charset=utf-8'}
+
+def _teardown_request(e=None):
+    for semaphore in g.pop('_admission_release', ()):
+        semaphore.release()
+
+def reserve_lane(threads):
+    """Викликається у воркері gunicorn: звичайні запити займають не більше threads - 1 потоків."""
+    global _inflight, _inflight_limit
+    limit = ADMISSION_MAX_INFLIGHT or threads - 1
+    _inflight, _inflight_limit = (threading.BoundedSemaphore(limit), limit) if limit >= 1 else (None, None)
+
+def stats():
+    return {'enabled': ADMISSION, 'shed': dict(_shed), 'inflight_limit': _inflight_limit}
+
+def init_app(app):
+    if not ADMISSION:
+        return
+    if ADMISSION_CLIENT_HEADER and not ADMISSION_TRUSTED_PROXIES:
+        print(f"⚠️ ADMISSION_CLIENT_HEADER={ADMISSION_CLIENT_HEADER} ігнорується без ADMISSION_TRUSTED_PROXIES")
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
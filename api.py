@@ -1,19 +1,48 @@
-from flask import Blueprint, jsonify, request, session, g
-from db import get_db
+from bisect import bisect_right
+from operator import itemgetter
+from flask import Blueprint, Response, jsonify, request, session, g
+from db import get_db, pool_stats, transaction
+from pagination import NUMBER, InvalidCursor, page_args, split_page, page_headers
+from streaming import CSV, NDJSON, stream_format, stream_rows
+from conditional import conditional
+import metrics
+import hashing
+import writer
+import admission
+import catalog
+import stats
+import retention
+import serialize
+from search import SEARCH_TYPES, fts_query, search_products, search_feedback
+from product_import import IMPORT_CHUNK, import_products, read_csv, read_ndjson
+from orders import BULK_ORDERS_MAX, parse_items, fetch_prices, find_users, insert_orders, order_history
 
 api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
 
-def dict_factory(cursor, row):
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
-
 def get_user_by_credentials(username, email):
     db = get_db()
     user = db.execute('SELECT * FROM users WHERE username = ? AND email = ?', (username, email)).fetchone()
     return user
 
+def feedback_query(db, limit, cursor=None):
+    """Курсор limit + 1 відгуків (нові спочатку) після ключа cursor."""
+    retention.attach(db)
+    if cursor:
+        return db.execute('''SELECT * FROM all_feedback WHERE (created_at, id) < (?, ?)
+                             ORDER BY created_at DESC, id DESC LIMIT ?''', (*cursor, limit + 1))
+    return db.execute('SELECT * FROM all_feedback ORDER BY created_at DESC, id DESC LIMIT ?', (limit + 1,))
+
+def feedback_page(db, limit, cursor=None):
+    """Сторінка відгуків (нові спочатку) та cursor наступної сторінки."""
+    return split_page(feedback_query(db, limit, cursor).fetchall(), limit, itemgetter('created_at', 'id'))
+
+def insert_feedback(db, username, text, rating):
+    return db.execute('INSERT INTO feedback (username, text, rating) VALUES (?, ?, ?)', (username, text, rating)).lastrowid
+
+@api_bp.errorhandler(InvalidCursor)
+def handle_invalid_cursor(e):
+    return jsonify({"error": str(e)}), 400
+
 # --- СИСТЕМА ---
 @api_bp.route('/status', methods=['GET'])
 def get_status():
@@ -44,12 +73,30 @@ def get_health():
     try:
         db = get_db()
         db.execute('SELECT 1').fetchone()
-        return jsonify({"status": "healthy", "database": "connected"}), 200
+        return jsonify({"status": "healthy", "database": "connected", "pool": pool_stats(),
+                        "hashing": hashing.hasher.stats(), "writer": writer.stats(),
+                        "admission": admission.stats()}), 200
     except Exception as e:
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Метрики Prometheus (усі воркери)
+    ---
+    tags:
+      - System
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Затримки за маршрутами, запити в обробці, SQL-запити та їх час, стан пулів з'єднань
+    """
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 # --- ТОВАРИ ---
 @api_bp.route('/products', methods=['GET'])
+@conditional('products')
 def get_products():
     """
     Отримати список товарів
@@ -61,20 +108,35 @@ def get_products():
         in: query
         type: string
         description: Фільтр за категорією (наприклад, 'Насіння')
+      - name: limit
+        in: query
+        type: integer
+        description: Розмір сторінки (максимум MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        description: Токен наступної сторінки із заголовка X-Next-Cursor
+      - name: stream
+        in: query
+        type: string
+        description: "1 — потоковий JSON-масив, ndjson — NDJSON, csv — CSV (або Accept: application/x-ndjson / text/csv); повний експорт без пагінації, формат сумісний з /products/import"
     responses:
       200:
         description: Список товарів успішно отримано
     """
     category = request.args.get('category')
-    db = get_db()
-    db.row_factory = dict_factory
-    
-    if category:
-        products = db.execute('SELECT * FROM products WHERE category = ?', (category,)).fetchall()
-    else:
-        products = db.execute('SELECT * FROM products').fetchall()
-        
-    return jsonify(products), 200
+    fmt = stream_format()
+    if fmt:
+        db = get_db()
+        if category:
+            return stream_rows(db.execute('SELECT * FROM products WHERE category = ? ORDER BY id', (category,)), fmt)
+        return stream_rows(db.execute('SELECT * FROM products ORDER BY id'), fmt)
+    limit, cursor = page_args(int)
+    snapshot = catalog.get_catalog()
+    products = snapshot.products(category)
+    start = bisect_right(products, cursor[0], key=itemgetter('id')) if cursor else 0
+    page, next_cursor = split_page(products[start:start + limit + 1], limit, lambda p: (p['id'],))
+    return serialize.response(snapshot.encode(page), 200, page_headers(next_cursor))
 
 @api_bp.route('/products', methods=['POST'])
 def create_product():
@@ -115,8 +177,59 @@ def create_product():
     cursor = db.execute('INSERT INTO products (name, price, category, image) VALUES (?, ?, ?, ?)',
                (data['name'], data['price'], data.get('category', 'General'), data.get('image', '')))
     db.commit()
+    catalog.invalidate()
     return jsonify({"id": cursor.lastrowid, "message": "Created"}), 201
 
+@api_bp.route('/products/import', methods=['POST'])
+def import_products_api():
+    """
+    Масовий імпорт товарів з CSV або NDJSON (Admin)
+    ---
+    tags:
+      - Products
+    consumes:
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - in: body
+        name: body
+        required: true
+        description: "CSV із заголовком (id,name,price,category,image) або по JSON-об'єкту на рядок. Рядки з id оновлюють наявні товари, без id — створюють нові."
+        schema:
+          type: string
+      - name: format
+        in: query
+        type: string
+        description: csv або ndjson (за замовчуванням — за Content-Type)
+      - name: chunk_size
+        in: query
+        type: integer
+        description: Скільки рядків записувати однією транзакцією
+    responses:
+      200:
+        description: "Підсумок: created, updated, unchanged, failed та errors [{line, error}]; некоректні рядки пропускаються"
+      400:
+        description: Потік не вдалося дочитати (aborted); уже записані пачки лишаються
+      403:
+        description: Тільки для адмінів
+      415:
+        description: Невідомий формат
+    """
+    if session.get('role') != 'admin' and not session.get('admin_access'):
+        return jsonify({"error": "Admin only"}), 403
+    fmt = request.args.get('format') or {CSV: 'csv', NDJSON: 'ndjson'}.get(request.mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "Очікується text/csv або application/x-ndjson"}), 415
+    chunk_size = request.args.get('chunk_size', type=int)
+    if chunk_size is not None and chunk_size < 1:
+        return jsonify({"error": "chunk_size має бути додатним цілим числом"}), 400
+
+    reader = read_csv if fmt == 'csv' else read_ndjson
+    result = import_products(get_db(), reader(request.stream), chunk_size or IMPORT_CHUNK)
+    if result['created'] or result['updated']:
+        catalog.invalidate()
+    return jsonify(result), 400 if 'aborted' in result else 200
+
 @api_bp.route('/products/<int:id>', methods=['DELETE'])
 def delete_product(id):
     """
@@ -138,24 +251,43 @@ def delete_product(id):
     db = get_db()
     db.execute('DELETE FROM products WHERE id = ?', (id,))
     db.commit()
+    catalog.invalidate()
     return jsonify({"message": "Deleted"}), 200
 
 # --- ВІДГУКИ ---
 @api_bp.route('/feedback', methods=['GET'])
+@conditional('feedback')
 def get_feedbacks():
     """
-    Отримати всі відгуки
+    Отримати відгуки (сторінками, нові спочатку)
     ---
     tags:
       - Feedback
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        description: Розмір сторінки (максимум MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        description: Токен наступної сторінки із заголовка X-Next-Cursor
+      - name: stream
+        in: query
+        type: string
+        description: "1 — потоковий JSON-масив, ndjson — NDJSON (або Accept: application/x-ndjson); повний експорт без пагінації"
     responses:
       200:
         description: Список відгуків
     """
-    db = get_db()
-    db.row_factory = dict_factory
-    feedbacks = db.execute('SELECT * FROM feedback ORDER BY created_at DESC').fetchall()
-    return jsonify(feedbacks), 200
+    fmt = stream_format()
+    if fmt:
+        db = retention.attach(get_db())
+        return stream_rows(db.execute('SELECT * FROM all_feedback ORDER BY created_at DESC, id DESC'), fmt)
+    limit, cursor = page_args(str, int)
+    layout, rows = serialize.fetch(feedback_query(get_db(), limit, cursor))
+    feedbacks, next_cursor = split_page(rows, limit, layout.key('created_at', 'id'))
+    return serialize.response(layout.encode(feedbacks), 200, page_headers(next_cursor))
 
 @api_bp.route('/feedback', methods=['POST'])
 def create_feedback_api():
@@ -190,10 +322,7 @@ def create_feedback_api():
     if not (1 <= data['rating'] <= 5):
         return jsonify({"error": "Оцінка повинна бути від 1 до 5"}), 400
         
-    db = get_db()
-    db.execute('INSERT INTO feedback (username, text, rating) VALUES (?, ?, ?)',
-               (data['username'], data['text'], data['rating']))
-    db.commit()
+    writer.write(insert_feedback, data['username'], data['text'], data['rating'])
     return jsonify({"message": "Відгук успішно створено"}), 201
 
 @api_bp.route('/feedback/<int:id>', methods=['DELETE'])
@@ -214,12 +343,19 @@ def delete_feedback(id):
     """
     if session.get('role') != 'admin' and not session.get('admin_access'):
         return jsonify({"error": "Admin only"}), 403
-    db = get_db()
-    db.execute('DELETE FROM feedback WHERE id = ?', (id,))
+    db = retention.attach(get_db())
+    if not db.execute('DELETE FROM feedback WHERE id = ?', (id,)).rowcount:
+        # Відгук уже в архіві: тригерів там немає, тож лічильник змін (ETag) збільшуємо вручну
+        if db.execute('DELETE FROM archive.feedback WHERE id = ?', (id,)).rowcount:
+            db.execute("UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'feedback'")
     db.commit()
     return jsonify({"message": "Feedback deleted"}), 200
 
 # --- ЗАМОВЛЕННЯ ---
+def create_order(db, user_id, items):
+    prices = fetch_prices(db, (product_id for product_id, _ in items))
+    return insert_orders(db, [(user_id, items)], prices)
+
 @api_bp.route('/orders', methods=['POST'])
 def create_order_api():
     """
@@ -257,42 +393,337 @@ def create_order_api():
     user = get_user_by_credentials(data['username'], data['email'])
     if user is None:
         return jsonify({"error": "Користувач з такими ім'ям та email не знайдений."}), 400
-        
-    user_id = user['id']
-    db = get_db()
-    total = 0 
-    for item in data['items']:
-        prod = db.execute('SELECT price FROM products WHERE id = ?', (item['product_id'],)).fetchone()
-        if prod: total += prod['price'] * item['quantity']
-        
-    cursor = db.execute('INSERT INTO orders (user_id, total_price) VALUES (?, ?)', (user_id, total))
-    order_id = cursor.lastrowid
-    
-    for item in data['items']:
-        db.execute('INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)',
-                   (order_id, item['product_id'], item['quantity']))
-    db.commit()
+    try:
+        items = parse_items(data['items'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    [(order_id, total)] = writer.write(create_order, user['id'], items)
     return jsonify({"order_id": order_id, "total": total, "message": "Замовлення успішно створено"}), 201
 
+@api_bp.route('/orders/bulk', methods=['POST'])
+def create_orders_bulk():
+    """
+    Створити багато замовлень одним запитом
+    ---
+    tags:
+      - Orders
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            orders:
+              type: array
+              items:
+                type: object
+                properties:
+                  username: {type: string}
+                  email: {type: string}
+                  items:
+                    type: array
+                    items:
+                      type: object
+                      properties:
+                        product_id: {type: integer}
+                        quantity: {type: integer}
+            chunk_size:
+              type: integer
+              description: Без нього все записується атомарно; з ним — транзакціями по chunk_size замовлень, некоректні замовлення пропускаються
+    responses:
+      201:
+        description: Замовлення створено
+      400:
+        description: Помилки валідації (в атомарному режимі нічого не записано)
+      413:
+        description: Забагато замовлень в одному запиті
+    """
+    data = request.get_json(silent=True) or {}
+    orders = data.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify({"error": "Поле orders має бути непорожнім списком"}), 400
+    if len(orders) > BULK_ORDERS_MAX:
+        return jsonify({"error": f"Не більше {BULK_ORDERS_MAX} замовлень за запит"}), 413
+    chunk_size = data.get('chunk_size')
+    if chunk_size is not None and (not isinstance(chunk_size, int) or chunk_size < 1):
+        return jsonify({"error": "chunk_size має бути додатним цілим числом"}), 400
+
+    db = get_db()
+    errors, parsed = [], []
+    for index, order in enumerate(orders):
+        try:
+            if not isinstance(order, dict) or not all(field in order for field in ('username', 'email', 'items')):
+                raise ValueError("Відсутні обов'язкові поля для замовлення")
+            parsed.append((index, (order['username'], order['email']), parse_items(order['items'])))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    users = find_users(db, {credentials for _, credentials, _ in parsed})
+    valid = []
+    for index, credentials, items in parsed:
+        if credentials in users:
+            valid.append((index, users[credentials], items))
+        else:
+            errors.append({"index": index, "error": "Користувач з такими ім'ям та email не знайдений."})
+    errors.sort(key=itemgetter('index'))
+    if errors and chunk_size is None:
+        return jsonify({"errors": errors, "message": "Жодне замовлення не створено"}), 400
+
+    created = []
+    step = chunk_size or max(len(valid), 1)
+    for start in range(0, len(valid), step):
+        chunk = valid[start:start + step]
+        with transaction(db):
+            prices = fetch_prices(db, (product_id for _, _, items in chunk for product_id, _ in items))
+            results = insert_orders(db, [(user_id, items) for _, user_id, items in chunk], prices)
+        created.extend({"index": index, "order_id": order_id, "total": total}
+                       for (index, _, _), (order_id, total) in zip(chunk, results))
+    status = 201 if created else 400
+    return jsonify({"created": created, "errors": errors}), status
+
 @api_bp.route('/orders', methods=['GET'])
+@conditional('orders', 'products', private=True)
 def get_all_orders():
     """
-    Отримати всі замовлення (Admin)
+    Отримати замовлення (Admin, сторінками, нові спочатку)
     ---
     tags:
       - Orders
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        description: Розмір сторінки (максимум MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        description: Токен наступної сторінки із заголовка X-Next-Cursor
+      - name: stream
+        in: query
+        type: string
+        description: "1 — потоковий JSON-масив, ndjson — NDJSON (або Accept: application/x-ndjson); повний експорт без пагінації"
+      - name: expand
+        in: query
+        type: string
+        enum: [items]
+        description: items — додати до кожного замовлення його товари (той самий запит, без окремих звернень)
     responses:
       200:
         description: Список замовлень
     """
     if session.get('role') != 'admin' and not session.get('admin_access'):
         return jsonify({"error": "Admin only"}), 403
-    db = get_db()
-    db.row_factory = dict_factory
-    orders = db.execute('''
-        SELECT o.id, o.total_price, o.created_at, u.username 
-        FROM orders o
-        JOIN users u ON o.user_id = u.id
-        ORDER BY o.created_at DESC
-    ''').fetchall()
-    return jsonify(orders), 200
\ No newline at end of file
+    fmt = stream_format()
+    if fmt:
+        # CROSS JOIN фіксує порядок: спершу all_orders за idx_orders_keyset, інакше з індексом
+        # idx_orders_user планувальник може почати з users і сортувати весь результат
+        return stream_rows(retention.attach(get_db()).execute('''
+            SELECT o.id, o.total_price, o.created_at, u.username
+            FROM all_orders o
+            CROSS JOIN users u ON o.user_id = u.id
+            ORDER BY o.created_at DESC, o.id DESC
+        '''), fmt)
+    limit, cursor = page_args(str, int)
+    if request.args.get('expand') == 'items':
+        layout, rows = serialize.fetch(order_history(get_db(), limit + 1, cursor), raw=('items',))
+    else:
+        layout, rows = serialize.fetch(retention.attach(get_db()).execute(f'''
+            SELECT o.id, o.total_price, o.created_at, u.username 
+            FROM all_orders o
+            CROSS JOIN users u ON o.user_id = u.id
+            {'WHERE (o.created_at, o.id) < (?, ?)' if cursor else ''}
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT ?
+        ''', (*(cursor or ()), limit + 1)))
+    orders, next_cursor = split_page(rows, limit, layout.key('created_at', 'id'))
+    return serialize.response(layout.encode(orders), 200, page_headers(next_cursor))
+
+@api_bp.route('/orders/<int:id>', methods=['GET'])
+@conditional('orders', 'products', private=True)
+def get_order(id):
+    """
+    Отримати замовлення з товарами (власник або Admin)
+    ---
+    tags:
+      - Orders
+    parameters:
+      - name: id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Замовлення з полем items (product_id, name, price — поточна ціна, quantity)
+      401:
+        description: Потрібен вхід
+      404:
+        description: Замовлення не знайдено
+    """
+    is_admin = session.get('role') == 'admin' or session.get('admin_access')
+    user_id = session.get('user_id')
+    if not is_admin and user_id is None:
+        return jsonify({"error": "Login required"}), 401
+    # Чуже замовлення для звичайного користувача — так само 404
+    layout, rows = serialize.fetch(order_history(get_db(), 1, order_id=id, user_id=None if is_admin else user_id),
+                                   raw=('items',))
+    if not rows:
+        return jsonify({"error": "Order not found"}), 404
+    return serialize.response(layout.encode_one(rows[0]))
+
+@api_bp.route('/users/me/orders', methods=['GET'])
+@conditional('orders', 'products', private=True)
+def get_my_orders():
+    """
+    Мої замовлення з товарами (сторінками, нові спочатку)
+    ---
+    tags:
+      - Orders
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        description: Розмір сторінки (максимум MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        description: Токен наступної сторінки із заголовка X-Next-Cursor
+    responses:
+      200:
+        description: Замовлення поточного користувача з полем items
+      401:
+        description: Потрібен вхід
+    """
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({"error": "Login required"}), 401
+    limit, cursor = page_args(str, int)
+    layout, rows = serialize.fetch(order_history(get_db(), limit + 1, cursor, user_id=user_id), raw=('items',))
+    orders, next_cursor = split_page(rows, limit, layout.key('created_at', 'id'))
+    return serialize.response(layout.encode(orders), 200, page_headers(next_cursor))
+
+# --- ПОШУК ---
+@api_bp.route('/search', methods=['GET'])
+@conditional('products', 'feedback')
+def search_api():
+    """
+    Повнотекстовий пошук товарів або відгуків (BM25, сторінками)
+    ---
+    tags:
+      - Search
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Слова для пошуку; кожне шукається як префікс
+      - name: type
+        in: query
+        type: string
+        enum: [products, feedback]
+        default: products
+      - name: limit
+        in: query
+        type: integer
+        description: Розмір сторінки (максимум MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        description: Токен наступної сторінки із заголовка X-Next-Cursor
+    responses:
+      200:
+        description: Знайдені записи від найрелевантнішого (score — BM25, менше = краще)
+      400:
+        description: Порожній запит або невідомий type
+    """
+    kind = request.args.get('type', 'products')
+    if kind not in SEARCH_TYPES:
+        return jsonify({"error": f"type must be one of {', '.join(SEARCH_TYPES)}"}), 400
+    query = fts_query(request.args.get('q'))
+    if not query:
+        return jsonify({"error": "Missing q"}), 400
+    limit, cursor = page_args(NUMBER, int)
+    search_page = search_products if kind == 'products' else search_feedback
+    layout, rows = serialize.fetch(search_page(get_db(), query, limit, cursor))
+    rows, next_cursor = split_page(rows, limit, layout.key('score', 'id'))
+    return serialize.response(layout.encode(rows), 200, page_headers(next_cursor))
+
+# --- СТАТИСТИКА ПРОДАЖІВ ---
+@api_bp.route('/stats/products', methods=['GET'])
+@conditional('orders', 'sales', private=True)
+def get_product_stats():
+    """
+    Продажі по товарах (Admin)
+    ---
+    tags:
+      - Stats
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        description: Кількість товарів (максимум MAX_PAGE_SIZE)
+      - name: sort
+        in: query
+        type: string
+        enum: [revenue, units]
+    responses:
+      200:
+        description: Товари з кількістю позицій, одиниць і виручкою, від найбільшої
+      403:
+        description: Тільки для адмінів
+    """
+    if session.get('role') != 'admin' and not session.get('admin_access'):
+        return jsonify({"error": "Admin only"}), 403
+    limit, _ = page_args()
+    layout, rows = serialize.fetch(stats.product_stats(get_db(), limit, request.args.get('sort', 'revenue')))
+    return serialize.response(layout.encode(rows))
+
+@api_bp.route('/stats/categories', methods=['GET'])
+@conditional('orders', 'sales', private=True)
+def get_category_stats():
+    """
+    Продажі по категоріях (Admin)
+    ---
+    tags:
+      - Stats
+    responses:
+      200:
+        description: Категорії з кількістю позицій, одиниць і виручкою
+      403:
+        description: Тільки для адмінів
+    """
+    if session.get('role') != 'admin' and not session.get('admin_access'):
+        return jsonify({"error": "Admin only"}), 403
+    layout, rows = serialize.fetch(stats.category_stats(get_db()))
+    return serialize.response(layout.encode(rows))
+
+@api_bp.route('/stats/daily', methods=['GET'])
+@conditional('orders', 'sales', private=True)
+def get_daily_stats():
+    """
+    Продажі по днях (Admin)
+    ---
+    tags:
+      - Stats
+    parameters:
+      - name: from
+        in: query
+        type: string
+        description: Перший день (YYYY-MM-DD), за замовчуванням 30 днів тому
+      - name: to
+        in: query
+        type: string
+        description: Останній день (YYYY-MM-DD), за замовчуванням сьогодні
+    responses:
+      200:
+        description: Дні з кількістю замовлень, одиниць і виручкою
+      400:
+        description: Невірний формат дати
+    """
+    if session.get('role') != 'admin' and not session.get('admin_access'):
+        return jsonify({"error": "Admin only"}), 403
+    try:
+        layout, rows = serialize.fetch(stats.daily_stats(get_db(), request.args.get('from'), request.args.get('to')))
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+    return serialize.response(layout.encode(rows))
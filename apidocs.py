@@ -0,0 +1,62 @@
+import importlib.util
+import json
+import os
+import threading
+from flask import Response, current_app, render_template, send_from_directory
+
+# Документація API без flasgger у робочих процесах: специфікація генерується з YAML-докстрінгів
+# один раз командою `flask build-openapi` у openapi.json, а /apidocs/ — проста сторінка Swagger UI.
+# flasgger (разом з jsonschema) імпортується лише під час збірки або якщо файлу ще немає (розробка).
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SPEC_FILE = os.path.join(ROOT, 'openapi.json')
+SPEC_ROUTE = '/apispec_1.json'
+UI_ROUTE = '/apidocs/'
+# Файли Swagger UI беруться з пакета flasgger без його імпорту
+UI_STATIC = os.path.join(importlib.util.find_spec('flasgger').submodule_search_locations[0], 'ui3', 'static')
+CONFIG = {'title': 'Stardew Valley API', 'uiversion': 3, 'specs_route': UI_ROUTE}
+
+_spec = None
+_lock = threading.Lock()
+
+def generate_spec(app):
+    """Специфікація зі всіх маршрутів з YAML у докстрінгах (як її будував Swagger(app))."""
+    from flasgger import Swagger
+    swagger = Swagger(config=CONFIG, merge=True)
+    swagger.app = app
+    with app.app_context():
+        return swagger.get_apispecs()
+
+def build_spec(app, path=SPEC_FILE):
+    spec = generate_spec(app)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(spec, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    return spec
+
+def _load_spec():
+    """Готовий JSON специфікації; без зібраного файлу (або в debug) — згенерований на льоту."""
+    global _spec
+    if _spec is not None and not current_app.debug:
+        return _spec
+    with _lock:
+        if os.path.exists(SPEC_FILE) and not current_app.debug:
+            with open(SPEC_FILE, 'rb') as f:
+                _spec = f.read()
+        else:
+            _spec = json.dumps(generate_spec(current_app), ensure_ascii=False).encode('utf-8')
+    return _spec
+
+def init_app(app):
+    def spec():
+        return Response(_load_spec(), mimetype='application/json')
+
+    def ui():
+        return render_template('apidocs.html', title=CONFIG['title'], spec_url=SPEC_ROUTE)
+
+    def ui_static(filename):
+        return send_from_directory(UI_STATIC, filename)
+
+    app.add_url_rule(SPEC_ROUTE, 'apispec', spec)
+    app.add_url_rule(UI_ROUTE, 'apidocs', ui)
+    app.add_url_rule('/flasgger_static/<path:filename>', 'apidocs_static', ui_static)
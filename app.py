@@ -1,14 +1,34 @@
 import os
 import functools
-from flask import Flask, render_template, request, redirect, url_for, session, flash, g
-from werkzeug.security import generate_password_hash, check_password_hash
-from db import get_db, close_db, init_db, DATABASE
-from flasgger import Swagger
+import click
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, abort
+from werkzeug.security import generate_password_hash
+from db import get_db, close_db, connect, init_db, migrate_db, DATABASE
+from migrations import check_query_plans
+from catalog import get_catalog
+from stats import rebuild_sales_stats
+from search import fts_query, product_ids
+from orders import fetch_prices, insert_orders
+from conditional import conditional
+from page_cache import render_page
+import cart_store
+from cart_store import current_cart_id
+from principal import LazyGlobals, lazy_global
+import metrics
+import hashing
+import assets
+import writer
+import admission
+import apidocs
+import retention
 from flask_cors import CORS
-from api import api_bp 
+from api import api_bp, feedback_page, insert_feedback
+from pagination import InvalidCursor, page_args
 
 # --- КОНФІГУРАЦІЯ ---
 app = Flask(__name__)
+# g.user і g.cart_count завантажуються лише тоді, коли їх справді читають
+app.app_ctx_globals_class = LazyGlobals
 app.secret_key = os.environ.get('SECRET_KEY', 'stardew_valley_secret_key_change_me')
 
 # Пароль для адмінки
@@ -19,30 +39,29 @@ CORS(app)
 # 1. Спочатку реєструємо Blueprint
 app.register_blueprint(api_bp)
 
-# 2. Потім налаштовуємо та ініціалізуємо Swagger
-app.config['SWAGGER'] = {
-    'title': 'Stardew Valley API',
-    'uiversion': 3,
-    'specs_route': '/apidocs/'
-}
-Swagger(app)
+# 2. Документація API: готовий openapi.json (flask build-openapi) і Swagger UI на /apidocs/
+apidocs.init_app(app)
 
 app.teardown_appcontext(close_db)
+metrics.init_app(app)
+hashing.init_app(app)
+writer.init_app(app)
+admission.init_app(app)
+assets.init_app(app)
 
 # --- ГЛОБАЛЬНА ЛОГІКА ---
 @app.before_request
 def load_logged_in_user():
-    user_id = session.get('user_id')
-    if user_id is None:
-        g.user = None
-    else:
-        g.user = get_db().execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    
-    if isinstance(session.get('cart'), list):
-        session['cart'] = {}
-        session.modified = True 
+    # Сам користувач (g.user) завантажується ліниво через principal.current_user.
+    # Старий кошик у cookie переноситься на сервер один раз; далі cookie містить лише cart_id.
+    # `in` не позначає сесію як прочитану, тож відповіді без сесії не отримують Vary: Cookie.
+    if 'cart' in session:
+        cart_store.import_legacy_cart()
 
-    g.cart_count = sum(session.get('cart', {}).values())
+@lazy_global('cart_count')
+def load_cart_count():
+    cart_id = current_cart_id()
+    return cart_store.store.count(cart_id) if cart_id else 0
 
 def login_required(view):
     @functools.wraps(view)
@@ -54,32 +73,40 @@ def login_required(view):
 
 # --- МАРШРУТИ ---
 @app.route('/')
-def home(): return render_template('home.html')
+@conditional(private=True)
+def home(): return render_page('home.html')
 
 @app.route('/about')
-def about(): return render_template('about.html')
+@conditional(private=True)
+def about(): return render_page('about.html')
 
 @app.route('/guides')
-def guides(): return render_template('guides.html') 
+@conditional(private=True)
+def guides(): return render_page('guides.html') 
 
 @app.route('/characters')
-def characters(): return render_template('characters.html')
+@conditional(private=True)
+def characters(): return render_page('characters.html')
     
 @app.route('/map')
-def map(): return render_template('map.html')
+@conditional(private=True)
+def map(): return render_page('map.html')
 
 @app.route('/feedback', methods=('GET', 'POST'))
 def feedback():
-    db = get_db()
     if request.method == 'POST':
         if g.user is None: return redirect(url_for('login'))
         text = request.form['text']
         rating = request.form['rating']
-        db.execute('INSERT INTO feedback (username, text, rating) VALUES (?, ?, ?)', (g.user['username'], text, rating))
-        db.commit()
+        writer.write(insert_feedback, g.user['username'], text, rating)
         return redirect(url_for('feedback'))
-    feedbacks = db.execute('SELECT * FROM feedback ORDER BY created_at DESC').fetchall()
-    return render_template('feedback.html', feedbacks=feedbacks)
+    db = get_db()
+    try:
+        limit, cursor = page_args(str, int)
+    except InvalidCursor:
+        abort(400)
+    feedbacks, next_cursor = feedback_page(db, limit, cursor)
+    return render_template('feedback.html', feedbacks=feedbacks, next_cursor=next_cursor)
 
 # --- АВТЕНТИФІКАЦІЯ ---
 @app.route('/register', methods=('GET', 'POST'))
@@ -90,13 +117,13 @@ def register():
         email = request.form['email']
         role = 'user' 
         
-        db = get_db()
         error = None
         if not username: error = 'Login required.'
         elif not password: error = 'Password required.'
         if error is None:
+            hashed_pw = hashing.hash_password(password)
+            db = get_db()
             try:
-                hashed_pw = generate_password_hash(password)
                 db.execute('INSERT INTO users (username, email, password, role) VALUES (?, ?, ?, ?)', 
                            (username, email, hashed_pw, role))
                 db.commit()
@@ -112,14 +139,19 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        db = get_db()
         error = None
-        user = db.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        if user is None or not check_password_hash(user['password'], password):
+        user = get_db(readonly=True).execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        if user is None or not hashing.verify_password(user['password'], password):
             error = 'Невірний логін або пароль.'
         if error is None:
+            # Хеш зі старими параметрами тихо перераховується, поки відомий відкритий пароль
+            if hashing.needs_rehash(user['password']):
+                hashing.rehash(user['id'], password)
+            guest_cart_id = session.get('cart_id')
             session.clear()
             session['user_id'] = user['id']
+            if guest_cart_id:
+                cart_store.store.merge(guest_cart_id, cart_store.user_cart_id(user['id']))
             session['role'] = user['role']
             flash(f"Ласкаво просимо, {user['username']}!")
             return redirect(url_for('home'))
@@ -135,44 +167,44 @@ def logout():
 
 # --- МАГАЗИН ---
 @app.route('/shop')
+@conditional('products', private=True)
 def shop():
     category = request.args.get('category')
     sort_by = request.args.get('sort_by', 'id')
     order = request.args.get('order', 'ASC')
-    db = get_db()
     valid_sorts = {'price': 'price', 'name': 'name', 'id': 'id'}
     sort_column = valid_sorts.get(sort_by, 'id')
     sort_order = 'DESC' if order == 'DESC' else 'ASC'
-    query = "SELECT * FROM products"
-    params = []
-    if category:
-        query += " WHERE category = ?"
-        params.append(category)
-    query += f" ORDER BY {sort_column} {sort_order}"
-    products = db.execute(query, params).fetchall()
+    products = get_catalog().products(category, sort_column, sort_order)
+    # Пошук: FTS5 повертає id товарів, фільтруємо вже відсортований знімок каталогу
+    query = fts_query(request.args.get('q'))
+    if query:
+        ids = product_ids(get_db(), query)
+        if 'sort_by' in request.args:
+            found = set(ids)
+            products = [product for product in products if product['id'] in found]
+        else:
+            # Без явного сортування — від найрелевантнішого
+            by_id = {product['id']: product for product in products}
+            products = [by_id[i] for i in ids if i in by_id]
     return render_template('shop.html', products=products, sort_by=sort_by, order=order)
 
 @app.route('/add_to_cart/<int:id>', methods=('POST',))
 def add_to_cart(id):
-    id_str = str(id)
-    if 'cart' not in session: session['cart'] = {}
-    session['cart'][id_str] = session['cart'].get(id_str, 0) + 1
-    session.modified = True
+    cart_store.store.add(current_cart_id(create=True), id, 1)
     flash("Товар додано до кошика!")
     return redirect(url_for('shop'))
 
 @app.route('/cart')
 def cart():
-    cart_items_dict = session.get('cart', {})
-    db = get_db()
+    cart_id = current_cart_id()
+    cart_items_dict = cart_store.store.get(cart_id) if cart_id else {}
     items_with_count = []
     total = 0
     if cart_items_dict:
-        product_ids = [int(p_id) for p_id in cart_items_dict.keys()]
-        placeholders = ','.join('?' for _ in product_ids)
-        products = db.execute(f'SELECT * FROM products WHERE id IN ({placeholders})', product_ids).fetchall()
+        products = get_catalog().get_many(cart_items_dict.keys())
         for product in products:
-            count = cart_items_dict.get(str(product['id']), 0)
+            count = cart_items_dict.get(product['id'], 0)
             if count > 0:
                 items_with_count.append({
                     'id': product['id'],
@@ -188,53 +220,44 @@ def cart():
 
 @app.route('/update_cart_item/<int:id>/<action>', methods=('POST',))
 def update_cart_item(id, action):
-    id_str = str(id) 
-    if 'cart' not in session: session['cart'] = {}
-    current_count = session['cart'].get(id_str, 0)
+    cart_id = current_cart_id()
+    current_count = cart_store.store.get(cart_id).get(id, 0) if cart_id else 0
     if action == 'increase':
-        session['cart'][id_str] = current_count + 1
+        cart_store.store.add(current_cart_id(create=True), id, 1)
         flash(f"Кількість товару збільшено.")
-    elif action == 'decrease':
+    elif action == 'decrease' and current_count > 0:
+        cart_store.store.add(cart_id, id, -1)
         if current_count > 1:
-            session['cart'][id_str] = current_count - 1
             flash(f"Кількість товару зменшено.")
-        elif current_count == 1:
-            session['cart'].pop(id_str, None) 
+        else:
             flash(f"Товар видалено з кошика.")
-    session.modified = True
     return redirect(url_for('cart'))
 
 @app.route('/clear_cart', methods=('POST',))
 def clear_cart():
-    session.pop('cart', None)
-    session.modified = True
+    cart_id = current_cart_id()
+    if cart_id:
+        cart_store.store.clear(cart_id)
     flash("Кошик успішно очищено!")
     return redirect(url_for('cart'))
 
+def place_order(db, user_id, items, cart_id):
+    prices = fetch_prices(db, (product_id for product_id, _ in items))
+    items = [(product_id, count) for product_id, count in items if product_id in prices]
+    insert_orders(db, [(user_id, items)], prices)
+    # Очищення кошика — у тій самій транзакції, що й замовлення
+    cart_store.store.clear(cart_id, db)
+
 @app.route('/checkout', methods=('POST',))
 @login_required
 def checkout():
-    cart_items_dict = session.get('cart', {})
+    cart_id = current_cart_id()
+    cart_items_dict = cart_store.store.get(cart_id)
     if not cart_items_dict: 
         flash("Кошик порожній, нічого оформлювати.")
         return redirect(url_for('shop'))
-    db = get_db()
-    product_ids = [int(p_id) for p_id in cart_items_dict.keys()]
-    placeholders = ','.join('?' for _ in product_ids)
-    products = db.execute(f'SELECT * FROM products WHERE id IN ({placeholders})', product_ids).fetchall()
-    total = 0
-    for p in products:
-        count = cart_items_dict.get(str(p['id']), 0)
-        total += p['price'] * count
-    cursor = db.execute('INSERT INTO orders (user_id, total_price) VALUES (?, ?)', (g.user['id'], total))
-    order_id = cursor.lastrowid
-    for p in products:
-        count = cart_items_dict.get(str(p['id']), 0)
-        if count > 0:
-            db.execute('INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)', (order_id, p['id'], count))
-    db.commit()
-    session.pop('cart', None)
-    session.modified = True
+    items = [(product_id, count) for product_id, count in cart_items_dict.items() if count > 0]
+    writer.write(place_order, g.user['id'], items, cart_id)
     flash("Замовлення успішно оформлено! Дякуємо за покупку!")
     return redirect(url_for('home'))
 
@@ -256,19 +279,102 @@ def manage():
 
 # --- ІНІЦІАЛІЗАЦІЯ ---
 def init_db_on_startup():
-    if not os.path.exists(DATABASE): 
+    if os.path.exists(DATABASE):
+        applied = migrate_db()
+        if applied:
+            print(f"🔧 Застосовано міграції: {applied}")
+    else:
         print("💡 База даних не знайдена. Ініціалізація...")
         init_db()
         with app.app_context():
             db = get_db()
-            hashed_pw = generate_password_hash('admin123')
+            hashed_pw = generate_password_hash('admin123', hashing.PASSWORD_METHOD)
             try:
                 db.execute('INSERT INTO users (username, email, password, role) VALUES (?, ?, ?, ?)',
                     ('admin', 'admin@stardew.com', hashed_pw, 'admin'))
                 db.commit()
             except Exception: pass
 
-init_db_on_startup()
+@app.cli.command('migrate')
+def migrate_command():
+    """Застосовує нові міграції схеми до існуючої БД."""
+    applied = migrate_db()
+    click.echo(f"Застосовано міграції: {applied}" if applied else "Схема вже актуальна.")
+
+@app.cli.command('check-plans')
+def check_plans_command():
+    """Падає, якщо якийсь гарячий запит виконується повним скануванням таблиці."""
+    with app.app_context():
+        problems = check_query_plans(retention.attach(get_db()))
+    for name, details in problems.items():
+        click.echo(f"❌ {name}: {'; '.join(details)}", err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo("✅ Усі гарячі запити використовують індекси.")
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Перераховує зведені таблиці продажів з усіх замовлень (бекфіл)."""
+    with app.app_context():
+        counts = rebuild_sales_stats(get_db(readonly=False))
+    click.echo("✅ " + ", ".join(f"{table}: {count}" for table, count in counts.items()))
+
+@app.cli.command('archive')
+@click.option('--days', type=int, default=retention.RETENTION_DAYS, show_default=True,
+              help='Переносити замовлення і відгуки, старші за стільки днів')
+@click.option('--batch', type=int, default=retention.RETENTION_BATCH, show_default=True, help='Рядків за транзакцію')
+@click.option('--no-vacuum', is_flag=True, help='Не запускати incremental vacuum')
+@click.option('--enable-vacuum', is_flag=True, help='Спершу перевести БД на auto_vacuum = INCREMENTAL (повний VACUUM)')
+def archive_command(days, batch, no_vacuum, enable_vacuum):
+    """Переносить старі замовлення і відгуки в архівну БД та звітує швидкість (рядків/с)."""
+    db = connect()
+    try:
+        if enable_vacuum:
+            retention.enable_incremental_vacuum(db)
+        report = retention.run(db, days, batch, vacuum=not no_vacuum)
+    finally:
+        db.close()
+    click.echo(f"Межа: {report['cutoff']} → {retention.ARCHIVE_DATABASE}")
+    for table, row in report['tables'].items():
+        click.echo(f"  {table}: {row['rows']} рядків за {row['seconds']} с ({row['rows_per_sec']} рядків/с)")
+    vacuum = report.get('vacuum', False)
+    if vacuum:
+        click.echo(f"  vacuum: звільнено {vacuum['pages']} сторінок за {vacuum['seconds']} с")
+    elif vacuum is None:
+        click.echo("  vacuum: auto_vacuum вимкнено (див. --enable-vacuum)")
+    click.echo("  розмір: " + ", ".join(f"{name} {size / 1048576:.1f} MB" for name, size in report['size'].items()))
+
+@app.cli.command('build-assets')
+@click.option('--clean', is_flag=True, help='Спершу видалити static/dist')
+def build_assets_command(clean):
+    """Збирає static/dist: імена з хешем вмісту, .gz/.br для текстових файлів, мініатюри, manifest.json."""
+    manifest = assets.build(app.static_folder, clean=clean)
+    thumbs = sum('@' in key for key in manifest)
+    click.echo(f"✅ {len(manifest) - thumbs} файлів, {thumbs} мініатюр"
+               + ("" if assets.Image else " (Pillow не встановлено — без мініатюр)")
+               + ("" if assets.brotli else ", без brotli"))
+
+@app.cli.command('build-openapi')
+def build_openapi_command():
+    """Генерує openapi.json з докстрінгів API (щоб воркери не імпортували flasgger)."""
+    spec = apidocs.build_spec(app)
+    click.echo(f"✅ {apidocs.SPEC_FILE}: {len(spec['paths'])} шляхів")
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Створює БД (якщо її немає) та застосовує міграції."""
+    init_db_on_startup()
+
+def create_app(init_database=False):
+    """Повертає модульний `app` (не фабрика: застосунок повністю налаштовується під час імпорту).
+
+    Імпорт не відкриває БД і не імпортує flasgger. Створення/міграція БД — тут (init_database=True),
+    у `flask init-db` або один раз у master gunicorn (on_starting); `flask run` БД не створює.
+    """
+    if init_database:
+        init_db_on_startup()
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Режим розробки; продакшн — gunicorn -c gunicorn.conf.py app:app
+    create_app(init_database=True).run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
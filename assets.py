@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from flask import current_app, request, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli необов'язковий: без нього лише .gz
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow необов'язковий: без нього мініатюри не створюються
+    Image = None
+
+# Збірка статики: файли з static/ копіюються в static/dist/ з хешем вмісту в імені
+# (images/shop/Pumpkin.png -> dist/images/shop/Pumpkin.3f9c1a2b7d.png), тож їх можна кешувати назавжди.
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 10
+COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml', '.ico')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+# Варіанти зображень: назва -> максимальний розмір (px). Зменшення лише вниз, пропорції зберігаються.
+THUMBNAILS = {'grid': 192, 'cart': 64}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Зібрати статику в master gunicorn перед стартом воркерів (docker-compose: static/dist — спільний з nginx том)
+ASSETS_BUILD_ON_START = os.environ.get('ASSETS_BUILD_ON_START', '0') == '1'
+# Без маніфесту gunicorn не стартує: інакше nginx і Flask розходяться в тому, які файли існують
+ASSETS_REQUIRED = os.environ.get('ASSETS_REQUIRED', '1') == '1'
+
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _emit(dist, rel, data, suffix=''):
+    """Пише data під ім'ям з хешем; повертає шлях відносно static/."""
+    stem, ext = os.path.splitext(rel)
+    built = f'{DIST_DIR}/{stem}{suffix}.{_fingerprint(data)}{ext}'
+    target = os.path.join(dist, built[len(DIST_DIR) + 1:])
+    if not os.path.exists(target):
+        _write(target, data)
+        if ext.lower() in COMPRESS_EXTENSIONS:
+            _write(target + '.gz', gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(data, quality=11))
+    return built
+
+def _thumbnails(dist, rel, path, data, manifest, built):
+    with Image.open(path) as image:
+        for variant, size in THUMBNAILS.items():
+            key = f'{rel}@{variant}'
+            if image.width <= size and image.height <= size:
+                manifest[key] = built  # вже достатньо мале — варіант збігається з оригіналом
+                continue
+            thumb = image.copy()
+            thumb.thumbnail((size, size), Image.LANCZOS)
+            out = os.path.join(dist, '.tmp' + os.path.splitext(rel)[1])
+            thumb.save(out, format=image.format, optimize=True)
+            with open(out, 'rb') as f:
+                thumb_data = f.read()
+            os.remove(out)
+            manifest[key] = _emit(dist, rel, thumb_data, f'.{variant}')
+
+def build(static_dir, clean=False):
+    """Збирає static/dist і manifest.json; повертає маніфест {вихідний шлях[@варіант]: шлях у dist}."""
+    dist = os.path.join(static_dir, DIST_DIR)
+    if clean and os.path.isdir(dist):
+        # Видаляється вміст, а не сама тека: у docker-compose вона — точка монтування тому
+        for entry in os.scandir(dist):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir) and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            manifest[rel] = built = _emit(dist, rel, data)
+            if Image is not None and name.lower().endswith(IMAGE_EXTENSIONS):
+                _thumbnails(dist, rel, path, data, manifest, built)
+    tmp = os.path.join(dist, MANIFEST + '.tmp')
+    _write(tmp, json.dumps(manifest, indent=1, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    os.replace(tmp, os.path.join(dist, MANIFEST))
+    _cache.clear()
+    return manifest
+
+def prepare(static_dir):
+    """Викликається в master gunicorn (on_starting): збирає статику або перевіряє, що її зібрано."""
+    if ASSETS_BUILD_ON_START:
+        build(static_dir)
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST)
+    if ASSETS_REQUIRED and not os.path.exists(path):
+        raise RuntimeError(f'Немає {path}: виконайте `flask build-assets` (або ASSETS_BUILD_ON_START=1; '
+                           'ASSETS_REQUIRED=0 — віддавати незібрану статику)')
+
+_cache = {}
+
+def get_manifest():
+    """Маніфест читається один раз на процес; у debug — перечитується після нової збірки."""
+    if 'manifest' in _cache and not current_app.debug:
+        return _cache['manifest']
+    path = os.path.join(current_app.static_folder, DIST_DIR, MANIFEST)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    if 'manifest' not in _cache or mtime != _cache['mtime']:
+        manifest = {}
+        if mtime is not None:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        _cache.update(manifest=manifest, mtime=mtime)
+    return _cache['manifest']
+
+def asset_url(filename, variant=None):
+    """Як url_for('static', filename=...), але повертає незмінний URL з хешем, якщо файл зібрано.
+
+    Приймає і шлях відносно static/, і вже готовий '/static/...' (так зберігаються зображення товарів).
+    Зовнішні URL повертаються без змін; без збірки — звичайний /static/ URL.
+    """
+    if not filename or filename.startswith(('http://', 'https://', '//', 'data:')):
+        return filename
+    prefix = current_app.static_url_path + '/'
+    rel = filename[len(prefix):] if filename.startswith(prefix) else filename.lstrip('/')
+    manifest = get_manifest()
+    built = manifest.get(f'{rel}@{variant}') if variant else None
+    built = built or manifest.get(rel)
+    if built is None and filename.startswith('/'):
+        return filename
+    return url_for('static', filename=built or rel)
+
+def init_app(app):
+    app.add_template_global(asset_url)
+
+    @app.after_request
+    def immutable_dist(response):
+        # Без nginx зібрані файли віддає Flask — теж з довгим кешем
+        if response.status_code == 200 and request.path.startswith(f'{app.static_url_path}/{DIST_DIR}/'):
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
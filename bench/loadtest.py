@@ -0,0 +1,335 @@
+"""Відтворення суміші запитів і звіт по кожному маршруту (RPS, p50/p95/p99).
+
+    # Flask test client у цьому ж процесі (без мережі)
+    python bench/loadtest.py --db /tmp/bench.db --test-client --duration 20 --out results.json
+    # Реальний сервер: вже запущений (--url) або запущений скриптом (--serve gunicorn|dev)
+    python bench/loadtest.py --db /tmp/bench.db --serve gunicorn --concurrency 32 --out results.json
+    # Порівняти з попереднім запуском
+    python bench/loadtest.py --db /tmp/bench.db --test-client --compare results.json
+
+Суміш — JSONL (--traffic), один запит на рядок:
+    {"method": "POST", "path": "/add_to_cart/{product_id}", "as": "user", "weight": 5}
+Поля: method, path, as (anon | user | admin), json / form (тіло), weight, name (мітка у звіті).
+Якщо в усіх рядків є weight, запити обираються випадково пропорційно вагам, інакше
+файл відтворюється послідовно по колу. Плейсхолдери: {product_id}, {feedback_id}, {category},
+{user}, {email}, {last_product_id}. Без --traffic використовується DEFAULT_MIX (див. --dump-mix).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import BENCH_PASSWORD, CATEGORIES  # noqa: E402
+from serve_compare import free_port, percentile, start_server, wait_ready  # noqa: E402
+
+DEFAULT_MIX = [
+    {"method": "GET", "path": "/", "weight": 8},
+    {"method": "GET", "path": "/about", "weight": 2},
+    {"method": "GET", "path": "/guides", "weight": 2},
+    {"method": "GET", "path": "/shop", "weight": 12},
+    {"method": "GET", "path": "/shop?sort_by=price&order=DESC", "weight": 4, "name": "GET /shop?sort"},
+    {"method": "GET", "path": "/shop?category={category}", "weight": 4, "name": "GET /shop?category"},
+    {"method": "GET", "path": "/shop", "as": "user", "weight": 6, "name": "GET /shop (user)"},
+    {"method": "POST", "path": "/add_to_cart/{product_id}", "as": "user", "weight": 5,
+     "name": "POST /add_to_cart/<id>"},
+    {"method": "GET", "path": "/cart", "as": "user", "weight": 4},
+    {"method": "POST", "path": "/checkout", "as": "user", "weight": 1},
+    {"method": "GET", "path": "/feedback", "weight": 3},
+    {"method": "POST", "path": "/login", "form": {"username": "{user}", "password": BENCH_PASSWORD}, "weight": 1},
+    {"method": "GET", "path": "/api/v1/status", "weight": 2},
+    {"method": "GET", "path": "/api/v1/health", "weight": 2},
+    {"method": "GET", "path": "/api/v1/products", "weight": 8},
+    {"method": "GET", "path": "/api/v1/products?category={category}", "weight": 2,
+     "name": "GET /api/v1/products?category"},
+    {"method": "GET", "path": "/api/v1/feedback", "weight": 5},
+    {"method": "POST", "path": "/api/v1/feedback", "weight": 1,
+     "json": {"username": "{user}", "email": "{email}", "text": "Бенчмарк-відгук", "rating": 5}},
+    {"method": "GET", "path": "/api/v1/orders", "as": "admin", "weight": 2},
+    {"method": "POST", "path": "/api/v1/orders", "weight": 1,
+     "json": {"username": "{user}", "email": "{email}", "items": [{"product_id": "{product_id}", "quantity": 2}]}},
+    {"method": "POST", "path": "/api/v1/products", "as": "admin", "weight": 0.2,
+     "json": {"name": "Бенчмарк-товар", "price": 100, "category": "{category}", "image": ""}},
+    {"method": "DELETE", "path": "/api/v1/products/{last_product_id}", "as": "admin", "weight": 0.2,
+     "name": "DELETE /api/v1/products/<id>"},
+    {"method": "DELETE", "path": "/api/v1/feedback/{feedback_id}", "as": "admin", "weight": 0.2,
+     "name": "DELETE /api/v1/feedback/<id>"},
+]
+
+class HttpSession:
+    """Keep-alive з'єднання з власними cookie (окрема сесія на кожну роль віртуального клієнта)."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookies = {}
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+
+    def request(self, method, path, json_body=None, form=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body, headers['Content-Type'] = json.dumps(json_body).encode(), 'application/json'
+        elif form is not None:
+            body, headers['Content-Type'] = urlencode(form).encode(), 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = header.split(';', 1)[0].partition('=')
+            if value:
+                self.cookies[name] = value
+            else:
+                self.cookies.pop(name, None)
+        return response.status, data
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json_body=None, form=None):
+        response = self.client.open(path, method=method, json=json_body, data=form)
+        return response.status_code, response.get_data()
+
+def fill(value, params):
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in params:
+            return params[value[1:-1]]
+        return value.format_map(params)
+    if isinstance(value, list):
+        return [fill(item, params) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, params) for key, item in value.items()}
+    return value
+
+class VirtualClient:
+    """Один потік навантаження: анонімна, користувацька та адмін-сесії."""
+
+    def __init__(self, number, make_session, sizes, rng):
+        self.number, self.make_session, self.sizes, self.rng = number, make_session, sizes, rng
+        self.sessions = {}
+        self.last_product_id = None
+        self.username = f'user{number % max(sizes["users"], 1) + 1}'
+
+    def session(self, role):
+        if role not in self.sessions:
+            session = self.make_session()
+            if role == 'user':
+                session.request('POST', '/login', form={'username': self.username, 'password': BENCH_PASSWORD})
+            elif role == 'admin':
+                session.request('POST', '/manage', form={'passcode': '0000'})
+            self.sessions[role] = session
+        return self.sessions[role]
+
+    def params(self):
+        user = f'user{self.rng.randrange(1, max(self.sizes["users"], 1) + 1)}'
+        return {
+            'product_id': self.rng.randrange(1, max(self.sizes['products'], 1) + 1),
+            'feedback_id': self.rng.randrange(1, max(self.sizes['feedback'], 1) + 1),
+            'category': self.rng.choice(CATEGORIES),
+            'user': user,
+            'email': f'{user}@bench.local',
+            'last_product_id': self.last_product_id or 0,
+        }
+
+    def run(self, entry):
+        params = self.params()
+        path = fill(entry['path'], params)
+        status, data = self.session(entry.get('as', 'anon')).request(
+            entry['method'], path, fill(entry.get('json'), params), fill(entry.get('form'), params))
+        if entry['method'] == 'POST' and entry['path'] == '/api/v1/products' and status == 201:
+            self.last_product_id = json.loads(data)['id']
+        return status
+
+def label(entry):
+    return entry.get('name') or f"{entry['method']} {entry['path']}" + (' (admin)' if entry.get('as') == 'admin' else '')
+
+def load_mix(path):
+    if not path:
+        return DEFAULT_MIX
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def data_sizes(db_path, args):
+    sizes = {'products': args.products, 'users': args.users, 'feedback': args.feedback}
+    if db_path and os.path.exists(db_path):
+        db = sqlite3.connect(db_path)
+        for key, table in (('products', 'products'), ('users', 'users'), ('feedback', 'feedback')):
+            sizes[key] = db.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+        db.close()
+    return sizes
+
+def run(mix, make_session, sizes, concurrency, duration, seed_value=1):
+    weighted = all('weight' in entry for entry in mix)
+    weights = [entry.get('weight', 1) for entry in mix]
+    samples = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def worker(number):
+        rng = random.Random(seed_value * 1000 + number)
+        client = VirtualClient(number, make_session, sizes, rng)
+        local = defaultdict(list)
+        local_status = defaultdict(lambda: defaultdict(int))
+        local_errors = defaultdict(int)
+        i = number
+        while time.perf_counter() < stop:
+            entry = rng.choices(mix, weights)[0] if weighted else mix[i % len(mix)]
+            i += 1
+            name = label(entry)
+            started = time.perf_counter()
+            try:
+                status = client.run(entry)
+            except Exception:
+                status = 'exception'
+            local[name].append(time.perf_counter() - started)
+            local_status[name][str(status)] += 1
+            if status == 'exception' or status >= 500:
+                local_errors[name] += 1
+        with lock:
+            for name, values in local.items():
+                samples[name].extend(values)
+                errors[name] += local_errors[name]
+                for status, count in local_status[name].items():
+                    statuses[name][status] += count
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, statuses, errors, duration)
+
+def summarize(samples, statuses, errors, duration):
+    def stats(values, count_errors):
+        return {
+            'count': len(values),
+            'rps': round(len(values) / duration, 2),
+            'errors': count_errors,
+            'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+        }
+    routes = {name: dict(stats(values, errors[name]), status=dict(statuses[name]))
+              for name, values in sorted(samples.items())}
+    everything = [value for values in samples.values() for value in values]
+    return {'total': stats(everything, sum(errors.values())), 'routes': routes}
+
+def print_report(result, baseline=None):
+    rows = [('TOTAL', result['total'])] + list(result['routes'].items())
+    print(f"{'route':<42} {'count':>8} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>5}")
+    for name, stats in rows:
+        line = (f"{name[:42]:<42} {stats['count']:>8} {stats['rps']:>9} {stats['p50_ms']:>9} "
+                f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['errors']:>5}")
+        if baseline:
+            old = baseline['total'] if name == 'TOTAL' else baseline['routes'].get(name)
+            if old and old['rps'] and old['p99_ms']:
+                line += (f"   rps {100 * (stats['rps'] / old['rps'] - 1):+.1f}%"
+                         f"  p99 {100 * (stats['p99_ms'] / old['p99_ms'] - 1):+.1f}%")
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Навантажувальний тест усіх маршрутів')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Адреса вже запущеного сервера, напр. http://127.0.0.1:5000')
+    target.add_argument('--test-client', action='store_true', help='Flask test client у цьому процесі')
+    target.add_argument('--serve', choices=['dev', 'gunicorn'], help='Запустити сервер на --db і тестувати його')
+    parser.add_argument('--db', help='БД (зазвичай з bench/seed.py); для --test-client/--serve обов\'язкова')
+    parser.add_argument('--traffic', help='JSONL-файл із сумішшю запитів')
+    parser.add_argument('--dump-mix', action='store_true', help='Вивести DEFAULT_MIX у форматі JSONL і вийти')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--products', type=int, default=4)
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--feedback', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='Зберегти результати в JSON')
+    parser.add_argument('--compare', help='JSON попереднього запуску для порівняння')
+    args = parser.parse_args()
+
+    if args.dump_mix:
+        for entry in DEFAULT_MIX:
+            print(json.dumps(entry, ensure_ascii=False))
+        return
+    if (args.test_client or args.serve) and not args.db:
+        parser.error('--test-client і --serve потребують --db')
+
+    mix = load_mix(args.traffic)
+    sizes = data_sizes(args.db, args)
+    server = None
+    if args.test_client:
+        os.environ['DATABASE_PATH'] = os.path.abspath(args.db)
+        # Усі запити бенчмарку йдуть з однієї адреси — ліміти admission.py вимкнені, якщо не задано явно
+        os.environ.setdefault('ADMISSION', '0')
+        os.chdir(ROOT)
+        import app as app_module
+        flask_app = app_module.create_app(init_database=True)
+        make_session = lambda: TestClientSession(flask_app)  # noqa: E731
+        target = 'test-client'
+    else:
+        if args.serve:
+            port = free_port()
+            env = dict(os.environ, DATABASE_PATH=os.path.abspath(args.db))
+            env.setdefault('ADMISSION', '0')
+            server = start_server(args.serve, port, env, args.workers, args.threads)
+            wait_ready(port)
+            host, target = '127.0.0.1', f'{args.serve} :{port}'
+        else:
+            parts = urlsplit(args.url)
+            host, port, target = parts.hostname, parts.port or 80, args.url
+        make_session = lambda: HttpSession(host, port)  # noqa: E731
+
+    try:
+        if args.warmup:
+            run(mix, make_session, sizes, args.concurrency, args.warmup, args.seed + 1)
+        result = run(mix, make_session, sizes, args.concurrency, args.duration, args.seed)
+    finally:
+        if server:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait()
+
+    result['meta'] = {
+        'target': target,
+        'traffic': args.traffic or 'DEFAULT_MIX',
+        'duration_s': args.duration,
+        'concurrency': args.concurrency,
+        'sizes': sizes,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip(),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
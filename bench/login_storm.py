@@ -0,0 +1,115 @@
+"""Затримка /shop під час шторму входів: хешування в потоці запиту (HASH_WORKERS=0) проти пулу процесів.
+
+    python bench/login_storm.py --duration 10 --logins 32 --probes 4
+
+Для кожного режиму gunicorn запускається на тій самій засіяній БД (bench/seed.py).
+--logins потоків безперервно надсилають POST /login, --probes потоків вимірюють GET /shop.
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import BENCH_PASSWORD, seed  # noqa: E402
+from serve_compare import free_port, percentile, start_server, wait_ready  # noqa: E402
+
+MODES = {'inline': '0', 'pool': None}
+
+def storm(port, logins, probes, users, duration):
+    shop, statuses = [], {}
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def login_client(number):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        i = number
+        while time.perf_counter() < stop:
+            body = urlencode({'username': f'user{i % users + 1}', 'password': BENCH_PASSWORD})
+            i += logins
+            try:
+                conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                if status in (429, 503):
+                    # Чесний клієнт чекає Retry-After, а не довбить сервер
+                    time.sleep(min(float(response.getheader('Retry-After', 1)), max(0, stop - time.perf_counter())))
+            except (OSError, http.client.HTTPException):
+                status = 'error'
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    def probe_client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', '/shop')
+                conn.getresponse().read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            local.append(time.perf_counter() - started)
+        with lock:
+            shop.extend(local)
+
+    threads = [threading.Thread(target=login_client, args=(n,)) for n in range(logins)]
+    threads += [threading.Thread(target=probe_client) for _ in range(probes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'shop_requests': len(shop),
+        'shop_p50_ms': round(percentile(shop, 50) * 1000, 2),
+        'shop_p99_ms': round(percentile(shop, 99) * 1000, 2),
+        'logins': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'logins_per_s': round(statuses.get(302, 0) / duration, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--logins', type=int, default=32, help='Потоків, що безперервно входять')
+    parser.add_argument('--probes', type=int, default=4, help='Потоків, що вимірюють /shop')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--hash-workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--modes', default='inline,pool')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        seed(db_path, products=200, users=args.users, orders=0, feedback=0, days=30)
+        for mode in args.modes.split(','):
+            env = dict(os.environ, DATABASE_PATH=db_path, HASH_WORKERS=MODES[mode] or str(args.hash_workers))
+            env.setdefault('ADMISSION', '0')
+            port = free_port()
+            server = start_server('gunicorn', port, env, args.workers, args.threads)
+            try:
+                wait_ready(port)
+                storm(port, 2, 1, args.users, 1)  # прогрів (у т.ч. запуск пулу хешування)
+                results[mode] = storm(port, args.logins, args.probes, args.users, args.duration)
+            finally:
+                os.killpg(server.pid, signal.SIGTERM)
+                server.wait()
+            r = results[mode]
+            print(f"{mode:>7}: /shop p50 {r['shop_p50_ms']} ms  p99 {r['shop_p99_ms']} ms  "
+                  f"входів {r['logins_per_s']}/с  статуси {r['logins']}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
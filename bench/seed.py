@@ -0,0 +1,108 @@
+"""Синтетична БД для бенчмарків.
+
+    python bench/seed.py --db /tmp/bench.db --products 500 --users 5000 --orders 1000000 --feedback 1000000
+
+Схема створюється з schema.sql + міграцій. Усі користувачі мають пароль BENCH_PASSWORD
+(логін user<N>, email user<N>@bench.local); адмін-сесія береться через /manage (пароль 0000).
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+BENCH_PASSWORD = 'bench'
+CATEGORIES = ['Артефакти', 'Інструменти', 'Насіння', 'Тварини', 'Зброя']
+IMAGES = ['Stardrop', 'Blue_Chicken', 'Galaxy_Sword', 'Pumpkin', 'Iridium_Band', 'Prismatic_Shard']
+WORDS = ['Зоряний', 'Золотий', 'Іридієвий', 'Галактичний', 'Старий', 'Чарівний', 'Гарбуз', 'Меч', 'Курка',
+         'Кільце', 'Осколок', 'Насіння', 'крапля', 'посох', 'кошик', 'ферма', 'долина', 'урожай']
+BATCH = 10000
+
+def batched(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def timestamp(rng, days):
+    moment = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(days * 86400))
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def seed(path, products, users, orders, feedback, days, seed_value=42):
+    rng = random.Random(seed_value)
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'schema.sql'), encoding='utf-8') as f:
+        db.executescript(f.read())
+    migrate(db)
+    # Лише на час заповнення: без fsync і без журналу
+    db.execute('PRAGMA synchronous = OFF')
+    db.execute('PRAGMA journal_mode = MEMORY')
+    started = time.perf_counter()
+
+    db.execute('DELETE FROM products')
+    db.executemany('INSERT INTO products (id, name, price, category, image) VALUES (?, ?, ?, ?, ?)', (
+        (i, f'{rng.choice(WORDS)} {rng.choice(WORDS).lower()} #{i}', rng.randrange(10, 10000),
+         rng.choice(CATEGORIES), f'/static/images/shop/{rng.choice(IMAGES)}.png')
+        for i in range(1, products + 1)))
+
+    password = generate_password_hash(BENCH_PASSWORD)
+    db.executemany('INSERT INTO users (username, email, password, role) VALUES (?, ?, ?, ?)', (
+        (f'user{i}', f'user{i}@bench.local', password, 'user') for i in range(1, users + 1)))
+    user_ids = [row[0] for row in db.execute('SELECT id FROM users')]
+    prices = dict(db.execute('SELECT id, price FROM products'))
+    db.commit()
+
+    order_id = db.execute('SELECT COALESCE(MAX(id), 0) FROM orders').fetchone()[0]
+    for batch in batched(range(orders)):
+        order_rows, item_rows = [], []
+        for _ in batch:
+            order_id += 1
+            items = [(rng.randrange(1, products + 1), rng.randrange(1, 5)) for _ in range(rng.randrange(1, 5))]
+            total = sum(prices[product_id] * quantity for product_id, quantity in items)
+            order_rows.append((order_id, rng.choice(user_ids), total, timestamp(rng, days)))
+            item_rows.extend((order_id, product_id, quantity) for product_id, quantity in items)
+        db.executemany('INSERT INTO orders (id, user_id, total_price, created_at) VALUES (?, ?, ?, ?)', order_rows)
+        db.executemany('INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)', item_rows)
+        db.commit()
+
+    for batch in batched(range(feedback)):
+        db.executemany('INSERT INTO feedback (username, text, rating, created_at) VALUES (?, ?, ?, ?)', [
+            (f'user{rng.randrange(1, users + 1)}', ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(3, 15))),
+             rng.randrange(1, 6), timestamp(rng, days)) for _ in batch])
+        db.commit()
+
+    db.execute('ANALYZE')
+    db.execute('PRAGMA journal_mode = WAL')
+    db.close()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='Заповнення синтетичної БД для бенчмарків')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--feedback', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=730, help='Період, на який розподілені created_at')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    elapsed = seed(args.db, args.products, args.users, args.orders, args.feedback, args.days, args.seed)
+    print(f'✅ {args.db}: {args.products} товарів, {args.users} користувачів, {args.orders} замовлень, '
+          f'{args.feedback} відгуків за {elapsed:.1f} с')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Швидкість серіалізації рядків у JSON: рядків/с для /api/v1/products, /feedback та /orders.
+
+    python bench/serialize_bench.py --products 50000 --feedback 200000 --orders 200000
+    python bench/serialize_bench.py --db /tmp/bench.db --out serialize.json
+
+Flask test client у цьому ж процесі. Кожен маршрут проходиться сторінками (--limit, за X-Next-Cursor)
+і повним потоковим експортом (?stream=1; замовлення з товарами і пошук — лише сторінками)
+для кожного бекенду serialize.py (json і, якщо встановлено, orjson).
+Час вимірюється лише на самих запитах; рядки рахуються після. Розділ encode порівнює вибірку і кодування
+тих самих рядків без Flask-маршруту: старий шлях (row_factory=dict_factory + jsonify) проти serialize.fetch + Layout.encode.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import seed  # noqa: E402
+
+ROUTES = {
+    'get_products': '/api/v1/products',
+    'get_feedbacks': '/api/v1/feedback',
+    'get_all_orders': '/api/v1/orders',
+}
+# Лише сторінками: готовий JSON у колонці items (Layout raw)
+PAGED_ROUTES = {
+    'get_all_orders expand=items': '/api/v1/orders?expand=items',
+    'search': '/api/v1/search?q=кільце',
+}
+ENCODE_QUERIES = {
+    'products': 'SELECT * FROM products ORDER BY id LIMIT ?',
+    'feedback': 'SELECT * FROM feedback ORDER BY created_at DESC, id DESC LIMIT ?',
+    'orders': '''SELECT o.id, o.total_price, o.created_at, u.username FROM orders o JOIN users u ON o.user_id = u.id
+                 ORDER BY o.created_at DESC, o.id DESC LIMIT ?''',
+}
+
+def dict_factory(cursor, row):
+    # Старий api.dict_factory — базовий рівень для порівняння
+    d = {}
+    for idx, col in enumerate(cursor.description):
+        d[col[0]] = row[idx]
+    return d
+
+def walk_pages(client, path, limit, max_pages):
+    rows, seconds, cursor = 0, 0.0, None
+    for _ in range(max_pages):
+        url = f"{path}{'&' if '?' in path else '?'}limit={limit}" + (f'&cursor={cursor}' if cursor else '')
+        started = time.perf_counter()
+        response = client.get(url)
+        body = response.get_data()
+        seconds += time.perf_counter() - started
+        assert response.status_code == 200, (url, response.status_code)
+        rows += len(json.loads(body))
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    return rows, seconds
+
+def stream_all(client, path):
+    started = time.perf_counter()
+    response = client.get(f'{path}?stream=1')
+    body = response.get_data()
+    seconds = time.perf_counter() - started
+    assert response.status_code == 200, (path, response.status_code)
+    return len(json.loads(body)), seconds
+
+def rate(rows, seconds):
+    return {'rows': rows, 'seconds': round(seconds, 3), 'rows_per_sec': round(rows / seconds) if seconds else 0}
+
+def bench_routes(app, backends, limit, max_pages):
+    import catalog
+    import serialize
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_access'] = True
+    results = {}
+    for backend in backends:
+        serialize.JSON_BACKEND = backend
+        # Кеш JSON товарів живе в знімку каталогу — кожен бекенд починає з холодного
+        catalog._snapshot = None
+        for name, path in ROUTES.items():
+            walk_pages(client, path, limit, 1)  # прогрів
+            results[f'{backend} {name} pages'] = rate(*walk_pages(client, path, limit, max_pages))
+            results[f'{backend} {name} stream'] = rate(*stream_all(client, path))
+        for name, path in PAGED_ROUTES.items():
+            walk_pages(client, path, limit, 1)
+            results[f'{backend} {name} pages'] = rate(*walk_pages(client, path, limit, max_pages))
+    return results
+
+def bench_encode(app, backends, db_path, rows, repeat):
+    from flask import jsonify
+    import serialize
+    db = sqlite3.connect(db_path)
+    results = {}
+    with app.app_context():
+        for name, sql in ENCODE_QUERIES.items():
+            db.execute(sql, (rows,)).fetchall()  # прогрів кешу сторінок
+            started = time.perf_counter()
+            for _ in range(repeat):
+                db.row_factory = dict_factory
+                dicts = db.execute(sql, (rows,)).fetchall()
+                jsonify(dicts).get_data()
+            results[f'dict_factory+jsonify {name}'] = rate(len(dicts) * repeat, time.perf_counter() - started)
+            db.row_factory = None
+            for backend in backends:
+                serialize.JSON_BACKEND = backend
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    layout, tuples = serialize.fetch(db.execute(sql, (rows,)))
+                    layout.encode(tuples)
+                results[f'{backend} {name}'] = rate(len(tuples) * repeat, time.perf_counter() - started)
+    db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='Готова БД (bench/seed.py); без неї засівається тимчасова')
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--feedback', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=200, help='Розмір сторінки (не більше MAX_PAGE_SIZE)')
+    parser.add_argument('--pages', type=int, default=100, help='Максимум сторінок на маршрут')
+    parser.add_argument('--encode-rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='Зберегти результати в JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db) if args.db else os.path.join(tmp, 'bench.db')
+        if not args.db:
+            seed(db_path, args.products, 2000, args.orders, args.feedback, 730)
+        os.environ['DATABASE_PATH'] = db_path
+        os.environ['ARCHIVE_DATABASE_PATH'] = os.path.join(tmp, 'archive.db')
+        os.environ.setdefault('ADMISSION', '0')
+        import app as app_module
+        import serialize
+        app = app_module.create_app(init_database=True)
+        backends = ['json'] + (['orjson'] if serialize.orjson else [])
+
+        results = {'routes': bench_routes(app, backends, args.limit, args.pages),
+                   'encode': bench_encode(app, backends, db_path, args.encode_rows, args.repeat)}
+    for section, rows in results.items():
+        print(f'--- {section}')
+        for name, row in rows.items():
+            print(f"{name:>46}: {row['rows']:>8} рядків  {row['seconds']:>7} с  {row['rows_per_sec']:>9} рядків/с")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
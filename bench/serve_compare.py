@@ -0,0 +1,126 @@
+"""Порівняння пропускної здатності: dev-сервер Werkzeug (debug=True) проти gunicorn.
+
+    python bench/serve_compare.py --duration 10 --concurrency 16
+
+Обидва сервери запускаються на копії однієї тимчасової БД, навантаження — keep-alive
+з'єднання з кількох потоків по колу маршрутів ROUTES.
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ['/', '/shop', '/api/v1/products', '/api/v1/feedback', '/api/v1/status']
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/v1/status')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер на порту {port} не запустився')
+
+def start_server(mode, port, env, workers, threads):
+    if mode == 'dev':
+        # Те саме, що `python app.py`, але на вільному порту
+        code = f'import app; app.create_app(init_database=True).run(debug=True, host="127.0.0.1", port={port})'
+        cmd = [sys.executable, '-c', code]
+    else:
+        # Статику бенчмарки не збирають (assets.prepare)
+        env = {'ASSETS_REQUIRED': '0', **env, 'WEB_WORKERS': str(workers), 'WEB_THREADS': str(threads), 'WEB_ACCESS_LOG': ''}
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app']
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run_load(port, concurrency, duration):
+    latencies, errors = [], []
+    stop = time.perf_counter() + duration
+
+    def client(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        local, failed, i = [], 0, offset
+        while time.perf_counter() < stop:
+            path = ROUTES[i % len(ROUTES)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            local.append(time.perf_counter() - started)
+        latencies.extend(local)
+        errors.append(failed)
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--modes', default='dev,gunicorn')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'bench.db'))
+        # Усі запити бенчмарку йдуть з однієї адреси — ліміти admission.py вимкнені, якщо не задано явно
+        env.setdefault('ADMISSION', '0')
+        for mode in args.modes.split(','):
+            port = free_port()
+            server = start_server(mode, port, env, args.workers, args.threads)
+            try:
+                wait_ready(port)
+                run_load(port, args.concurrency, 1)  # прогрів
+                results[mode] = run_load(port, args.concurrency, args.duration)
+            finally:
+                os.killpg(server.pid, signal.SIGTERM)
+                server.wait()
+            print(f"{mode:>9}: {results[mode]['rps']:>8} req/s  p50 {results[mode]['p50_ms']} ms  "
+                  f"p99 {results[mode]['p99_ms']} ms  errors {results[mode]['errors']}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Час холодного старту: від імпорту app до першої відповіді.
+
+    python bench/startup.py --runs 5
+    python bench/startup.py --modes import --budget-ms 600   # для CI: код 1, якщо медіана повільніша
+
+import — новий процес Python: `import app`, create_app(), перший запит через test client
+(так стартує кожен воркер без preload). gunicorn — від запуску `gunicorn app:app`
+з одним воркером до першої відповіді 200 по HTTP. БД створюється заздалегідь і в замір не входить.
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from serve_compare import ROOT, free_port, wait_ready  # noqa: E402
+
+PATH = '/api/v1/status'
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.create_app().test_client()
+status = client.get({path!r}).status_code
+done = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'first_response_ms': (done - started) * 1000,
+                   'status': status, 'flasgger_loaded': 'flasgger' in sys.modules}}))
+'''
+
+def run_import(env, path):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD.format(path=path)], cwd=ROOT, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+def run_gunicorn(env, path):
+    port = free_port()
+    env = {'ASSETS_REQUIRED': '0', **env, 'WEB_WORKERS': '1', 'WEB_THREADS': '1', 'WEB_ACCESS_LOG': ''}
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind',
+                               f'127.0.0.1:{port}', 'app:app'], cwd=ROOT, env=env,
+                              start_new_session=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        return {'first_response_ms': (time.perf_counter() - started) * 1000}
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+def summarize(runs):
+    return {key: round(statistics.median(run[key] for run in runs), 1)
+            for key in runs[0] if isinstance(runs[0][key], float)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modes', default='import,gunicorn')
+    parser.add_argument('--budget-ms', type=float, help='Максимальна медіана first_response_ms режиму import')
+    parser.add_argument('--out', help='Зберегти результати в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'bench.db'))
+        subprocess.run([sys.executable, '-c', 'import app; app.create_app(init_database=True)'],
+                       cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        for mode in args.modes.split(','):
+            runner = run_import if mode == 'import' else run_gunicorn
+            runs = [runner(env, PATH) for _ in range(args.runs)]
+            results[mode] = summarize(runs)
+            if mode == 'import':
+                results[mode]['flasgger_loaded'] = any(run['flasgger_loaded'] for run in runs)
+            print(f"{mode:>9}: " + '  '.join(f'{key} {value}' for key, value in results[mode].items()))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.budget_ms and results.get('import', {}).get('first_response_ms', 0) > args.budget_ms:
+        print(f"❌ Старт повільніший за {args.budget_ms} ms", file=sys.stderr)
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import session
+from db import get_db, transaction
+
+# Кошик зберігається на сервері; у cookie лежить лише короткий cart_id.
+# CART_BACKEND=sqlite — спільний для всіх воркерів (за замовчуванням),
+# CART_BACKEND=memory — словник у пам'яті процесу (dev-сервер, один воркер).
+CART_BACKEND = os.environ.get('CART_BACKEND', 'sqlite')
+CART_TTL = int(os.environ.get('CART_TTL', 30 * 24 * 3600))
+CART_EVICT_INTERVAL = int(os.environ.get('CART_EVICT_INTERVAL', 600))
+CART_MEMORY_MAX = int(os.environ.get('CART_MEMORY_MAX', 100000))
+
+def encode_items(items):
+    """{product_id: кількість} -> компактний рядок '3:2,7:1'."""
+    return ','.join(f'{product_id}:{quantity}' for product_id, quantity in sorted(items.items()) if quantity > 0)
+
+def decode_items(text):
+    items = {}
+    for pair in filter(None, (text or '').split(',')):
+        product_id, _, quantity = pair.partition(':')
+        items[int(product_id)] = int(quantity)
+    return items
+
+def _apply(items, product_id, delta):
+    quantity = items.get(product_id, 0) + delta
+    if quantity > 0:
+        items[product_id] = quantity
+    else:
+        items.pop(product_id, None)
+    return items
+
+class SQLiteCartStore:
+    """Кошики в таблиці carts: items у компактному рядку, item_count підтримується при кожному записі."""
+
+    def __init__(self):
+        self._next_evict = 0
+
+    @contextmanager
+    def _write(self, db=None):
+        # Передане з'єднання (потік запису writer.py) або вже відкрита транзакція — пишемо в неї ж
+        if db is not None:
+            yield db
+            return
+        db = get_db(readonly=False)
+        if db.in_transaction:
+            yield db
+        else:
+            with transaction(db):
+                yield db
+        self._maybe_evict()
+
+    def _load(self, db, cart_id):
+        row = db.execute('SELECT items, updated_at FROM carts WHERE id = ?', (cart_id,)).fetchone()
+        if row is None or row[1] < time.time() - CART_TTL:
+            return {}
+        return decode_items(row[0])
+
+    def _save(self, db, cart_id, items):
+        if not items:
+            db.execute('DELETE FROM carts WHERE id = ?', (cart_id,))
+            return 0
+        count = sum(items.values())
+        db.execute('''INSERT INTO carts (id, items, item_count, updated_at) VALUES (?, ?, ?, ?)
+                      ON CONFLICT (id) DO UPDATE SET items = excluded.items,
+                          item_count = excluded.item_count, updated_at = excluded.updated_at''',
+                   (cart_id, encode_items(items), count, time.time()))
+        return count
+
+    def get(self, cart_id):
+        return self._load(get_db(), cart_id)
+
+    def count(self, cart_id):
+        row = get_db().execute('SELECT item_count, updated_at FROM carts WHERE id = ?', (cart_id,)).fetchone()
+        if row is None or row[1] < time.time() - CART_TTL:
+            return 0
+        return row[0]
+
+    def add(self, cart_id, product_id, delta=1):
+        """Змінює кількість товару на delta (≤0 — видаляє позицію); повертає нову кількість у кошику."""
+        with self._write() as db:
+            return self._save(db, cart_id, _apply(self._load(db, cart_id), product_id, delta))
+
+    def update(self, cart_id, items):
+        """Додає кількості з items до кошика (злиття, перенесення старого cookie-кошика)."""
+        with self._write() as db:
+            current = self._load(db, cart_id)
+            for product_id, quantity in items.items():
+                _apply(current, product_id, quantity)
+            return self._save(db, cart_id, current)
+
+    def merge(self, source_id, target_id):
+        """Переносить гостьовий кошик у кошик користувача після входу."""
+        if source_id == target_id:
+            return
+        with self._write() as db:
+            source = self._load(db, source_id)
+            if source:
+                current = self._load(db, target_id)
+                for product_id, quantity in source.items():
+                    _apply(current, product_id, quantity)
+                self._save(db, target_id, current)
+                db.execute('DELETE FROM carts WHERE id = ?', (source_id,))
+
+    def clear(self, cart_id, db=None):
+        with self._write(db) as db:
+            db.execute('DELETE FROM carts WHERE id = ?', (cart_id,))
+
+    def _maybe_evict(self):
+        # Прострочені кошики видаляються не частіше ніж раз на CART_EVICT_INTERVAL у кожному воркері
+        now = time.time()
+        if now < self._next_evict:
+            return
+        self._next_evict = now + CART_EVICT_INTERVAL
+        db = get_db(readonly=False)
+        if not db.in_transaction:
+            with transaction(db):
+                db.execute('DELETE FROM carts WHERE updated_at < ?', (now - CART_TTL,))
+
+class MemoryCartStore:
+    """Кошики в пам'яті процесу: LRU на CART_MEMORY_MAX записів із TTL."""
+
+    def __init__(self, max_size=CART_MEMORY_MAX, ttl=CART_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._carts = OrderedDict()  # cart_id -> (items, item_count, updated_at)
+        self._lock = threading.Lock()
+
+    def _entry(self, cart_id):
+        entry = self._carts.get(cart_id)
+        if entry is None:
+            return None
+        if entry[2] < time.monotonic() - self.ttl:
+            del self._carts[cart_id]
+            return None
+        self._carts.move_to_end(cart_id)
+        return entry
+
+    def _save(self, cart_id, items):
+        if not items:
+            self._carts.pop(cart_id, None)
+            return 0
+        count = sum(items.values())
+        self._carts[cart_id] = (items, count, time.monotonic())
+        self._carts.move_to_end(cart_id)
+        while len(self._carts) > self.max_size:
+            self._carts.popitem(last=False)
+        return count
+
+    def get(self, cart_id):
+        with self._lock:
+            entry = self._entry(cart_id)
+            return dict(entry[0]) if entry else {}
+
+    def count(self, cart_id):
+        with self._lock:
+            entry = self._entry(cart_id)
+            return entry[1] if entry else 0
+
+    def add(self, cart_id, product_id, delta=1):
+        with self._lock:
+            entry = self._entry(cart_id)
+            return self._save(cart_id, _apply(dict(entry[0]) if entry else {}, product_id, delta))
+
+    def update(self, cart_id, items):
+        with self._lock:
+            entry = self._entry(cart_id)
+            current = dict(entry[0]) if entry else {}
+            for product_id, quantity in items.items():
+                _apply(current, product_id, quantity)
+            return self._save(cart_id, current)
+
+    def merge(self, source_id, target_id):
+        if source_id == target_id:
+            return
+        with self._lock:
+            source = self._carts.pop(source_id, None)
+            if source is None:
+                return
+            entry = self._entry(target_id)
+            current = dict(entry[0]) if entry else {}
+            for product_id, quantity in source[0].items():
+                _apply(current, product_id, quantity)
+            self._save(target_id, current)
+
+    def clear(self, cart_id, db=None):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+store = MemoryCartStore() if CART_BACKEND == 'memory' else SQLiteCartStore()
+
+def user_cart_id(user_id):
+    return f'u{user_id}'
+
+def current_cart_id(create=False):
+    """Id кошика поточного запиту: користувача (u<id>) або гостя (випадковий id у cookie)."""
+    user_id = session.get('user_id')
+    if user_id is not None:
+        return user_cart_id(user_id)
+    cart_id = session.get('cart_id')
+    if cart_id is None and create:
+        cart_id = session['cart_id'] = secrets.token_urlsafe(12)
+    return cart_id
+
+def import_legacy_cart():
+    """Одноразово переносить старий кошик із підписаного cookie (session['cart']) на сервер."""
+    legacy = session.pop('cart', None)
+    if isinstance(legacy, dict) and legacy:
+        items = {int(product_id): int(quantity) for product_id, quantity in legacy.items() if int(quantity) > 0}
+        if items:
+            store.update(current_cart_id(create=True), items)
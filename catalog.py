@@ -0,0 +1,68 @@
+import threading
+from operator import itemgetter
+from flask import g
+from db import get_db, get_generation
+import serialize
+
+# Колонки, за якими магазин дозволяє сортування
+SORT_COLUMNS = ('id', 'price', 'name')
+
+class Catalog:
+    """Незмінний знімок каталогу: товари заздалегідь відсортовані та згруповані за категоріями."""
+
+    def __init__(self, generation, rows):
+        self.generation = generation
+        self.by_id = {row['id']: row for row in rows}
+        # JSON товару кодується один раз на знімок, сторінка API — лише склеювання готових bytes
+        self._encoded = {}
+        groups = {None: rows}
+        for row in rows:
+            groups.setdefault(row['category'], []).append(row)
+        self._views = {}
+        for category, items in groups.items():
+            for column in SORT_COLUMNS:
+                ordered = sorted(items, key=itemgetter(column))
+                self._views[(category, column, 'ASC')] = ordered
+                self._views[(category, column, 'DESC')] = ordered[::-1]
+
+    def products(self, category=None, sort_by='id', order='ASC'):
+        return self._views.get((category or None, sort_by, order), [])
+
+    def get_many(self, ids):
+        return [self.by_id[i] for i in sorted(ids) if i in self.by_id]
+
+    def encode(self, rows):
+        """JSON-масив (bytes) товарів цього знімка."""
+        parts = []
+        for row in rows:
+            part = self._encoded.get(row['id'])
+            if part is None:
+                part = self._encoded[row['id']] = serialize.encode_value(row)
+            parts.append(part)
+        return b'[' + b','.join(parts) + b']'
+
+_snapshot = None
+_lock = threading.Lock()
+
+def get_catalog():
+    """Повертає актуальний знімок каталогу; перечитує products лише після зміни generation."""
+    snapshot = getattr(g, '_catalog', None)
+    if snapshot is not None:
+        return snapshot
+    global _snapshot
+    generation = get_generation('products')
+    snapshot = _snapshot
+    if snapshot is None or snapshot.generation != generation:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.generation != generation:
+                rows = get_db().execute('SELECT * FROM products ORDER BY id').fetchall()
+                snapshot = _snapshot = Catalog(generation, [dict(row) for row in rows])
+    g._catalog = snapshot
+    return snapshot
+
+def invalidate():
+    """Скидає кеш цього воркера (інші воркери побачать новий generation)."""
+    global _snapshot
+    _snapshot = None
+    g.pop('_catalog', None)
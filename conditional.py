@@ -0,0 +1,76 @@
+import functools
+import glob
+import hashlib
+import os
+from datetime import datetime, timezone
+from flask import current_app, request, session, g, make_response
+from db import get_generations
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Від цих файлів залежить HTML: шаблони та маніфест зібраної статики (URL з хешами)
+STAMP_GLOBS = (os.path.join(ROOT, 'templates', '*.html'), os.path.join(ROOT, 'static', 'dist', 'manifest.json'))
+
+def _build_stamp():
+    """(ідентифікатор збірки, час останньої зміни шаблонів і статики) — однакові в усіх воркерах одного деплою."""
+    digest = hashlib.sha1(os.environ.get('BUILD_ID', '').encode())
+    newest = 0.0
+    for path in sorted(path for pattern in STAMP_GLOBS for path in glob.glob(pattern)):
+        mtime = os.path.getmtime(path)
+        newest = max(newest, mtime)
+        digest.update(f'{path}:{mtime}'.encode())
+    return digest.hexdigest()[:16], datetime.fromtimestamp(int(newest), timezone.utc)
+
+_BUILD = _build_stamp()
+
+def current_build():
+    """Штамп поточної збірки; у debug перераховується з mtime шаблонів при кожному виклику."""
+    return _BUILD if not current_app.debug else _build_stamp()
+
+def conditional(*tables, private=False):
+    """ETag/Last-Modified для GET без виконання самого view, якщо клієнт має актуальну копію.
+
+    Валідатор будується з лічильників змін таблиць (table_generations), ідентифікатора збірки
+    та query string. Для сторінок з персональною шапкою (private=True) до нього додаються
+    користувач і кошик, а кешування дозволене лише браузеру (Vary: Cookie).
+    Last-Modified/If-Modified-Since — лише для публічних сторінок без таблиць (залежать тільки від збірки):
+    updated_at має точність у секунду, і друга зміна в ту саму секунду дала б застарілий 304.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(**kwargs):
+            # Flash-повідомлення в шапці показуються один раз — такі сторінки не кешуємо
+            if request.method not in ('GET', 'HEAD') or (private and '_flashes' in session):
+                return view(**kwargs)
+            build_id, last_modified = current_build()
+            # Дата не враховує ні лічильники таблиць у межах секунди, ні користувача і кошик
+            by_date = not tables and not private
+            parts = [build_id, request.full_path, request.headers.get('Accept', '')]
+            if tables:
+                generations = get_generations(tables)
+                for table in tables:
+                    generation, _ = generations.get(table, (0, None))
+                    parts.append(f'{table}={generation}')
+            if private:
+                parts += [str(session.get('user_id')), str(session.get('admin_access')), str(g.cart_count)]
+            etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (by_date and bool(request.if_modified_since)
+                                and last_modified <= request.if_modified_since)
+            response = make_response('', 304) if not_modified else make_response(view(**kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if by_date:
+                    response.last_modified = last_modified
+                response.cache_control.no_cache = True
+                if private:
+                    response.cache_control.private = True
+                    response.vary.add('Cookie')
+                else:
+                    response.cache_control.public = True
+                response.vary.add('Accept')
+            return response
+        return wrapped
+    return decorator
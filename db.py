@@ -1,20 +1,235 @@
 import sqlite3
 import os
-from flask import g
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from migrations import migrate
+from metrics import record_sql
 
 # [ЛАБА 8] Шлях до БД
 DATABASE = os.environ.get('DATABASE_PATH', 'database.db')
 
-def get_db():
-    db = getattr(g, '_database', None)
+# Пул з'єднань та PRAGMA-налаштування SQLite
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 4))
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 8))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 268435456))
+DB_CACHE_SIZE = int(os.environ.get('DB_CACHE_SIZE', -16000))
+DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 5000))
+DB_CACHED_STATEMENTS = int(os.environ.get('DB_CACHED_STATEMENTS', 256))
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, що звітує час виконання та вибірки в metrics.record_sql."""
+
+    def execute(self, sql, parameters=()):
+        self.traced_sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.traced_sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_sql(sql, time.perf_counter() - started)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            # Вибірка — продовження того ж запиту: додаємо лише час
+            record_sql(self.traced_sql, time.perf_counter() - started, statement=False)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+class TracedConnection(sqlite3.Connection):
+    """З'єднання, всі execute/executemany якого проходять через TracedCursor."""
+
+    def execute(self, sql, parameters=(), /):
+        return self.cursor(TracedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        return self.cursor(TracedCursor).executemany(sql, parameters)
+
+def connect(readonly=False):
+    """Нове з'єднання з усіма PRAGMA-налаштуваннями."""
+    db = sqlite3.connect(DATABASE, timeout=DB_BUSY_TIMEOUT / 1000, factory=TracedConnection,
+                         check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+    db.executescript(f"""
+        PRAGMA busy_timeout = {DB_BUSY_TIMEOUT};
+        PRAGMA journal_mode = {DB_JOURNAL_MODE};
+        PRAGMA synchronous = {DB_SYNCHRONOUS};
+        PRAGMA mmap_size = {DB_MMAP_SIZE};
+        PRAGMA cache_size = {DB_CACHE_SIZE};
+        PRAGMA query_only = {'ON' if readonly else 'OFF'};
+    """)
+    db.row_factory = sqlite3.Row
+    db.readonly = readonly
+    return db
+
+class ConnectionPool:
+    """Пул багаторазових з'єднань одного воркера (окремо для читання і запису)."""
+
+    def __init__(self, size, readonly=False):
+        self.size = size
+        self.readonly = readonly
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        # Після fork успадковані з'єднання не закриваємо, а просто забуваємо
+        self._pid = os.getpid()
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.high_water = 0
+
+    def acquire(self):
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset()
+            self.checkouts += 1
+            if not self._idle and self._created >= self.size:
+                self.waits += 1
+                started = time.perf_counter()
+                ready = self._cond.wait_for(lambda: self._idle or self._created < self.size, DB_POOL_TIMEOUT)
+                self.wait_time += time.perf_counter() - started
+                if not ready:
+                    self.timeouts += 1
+                    raise sqlite3.OperationalError('connection pool exhausted')
+            if self._idle:
+                db = self._idle.pop()
+            else:
+                self._created += 1
+                db = None
+            self._in_use += 1
+            self.high_water = max(self.high_water, self._in_use)
+        if db is None:
+            try:
+                db = connect(self.readonly)
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        return db
+
+    def release(self, db):
+        try:
+            if db.in_transaction:
+                db.rollback()
+            db.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            db.close()
+            db = None
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            if db is None:
+                self._created -= 1
+            else:
+                self._idle.append(db)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            for db in self._idle:
+                db.close()
+            self._created -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'open': self._created,
+            'in_use': self._in_use,
+            'idle': len(self._idle),
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'wait_time_ms': round(self.wait_time * 1000, 3),
+            'timeouts': self.timeouts,
+            'high_water': self.high_water,
+        }
+
+write_pool = ConnectionPool(DB_POOL_SIZE)
+read_pool = ConnectionPool(DB_READ_POOL_SIZE, readonly=True)
+
+def get_db(readonly=None):
+    """З'єднання поточного запиту; GET/HEAD за замовчуванням отримують read-only з'єднання."""
+    if readonly is None:
+        readonly = has_request_context() and request.method in ('GET', 'HEAD')
+    attr = '_database_ro' if readonly else '_database'
+    db = getattr(g, attr, None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = (read_pool if readonly else write_pool).acquire()
+        setattr(g, attr, db)
     return db
 
 def close_db(e=None):
-    db = getattr(g, '_database', None)
-    if db is not None:
+    for attr, pool in (('_database', write_pool), ('_database_ro', read_pool)):
+        db = g.pop(attr, None)
+        if db is not None:
+            pool.release(db)
+
+@contextmanager
+def transaction(db):
+    """Явна транзакція: BEGIN IMMEDIATE одразу бере блокування запису, один COMMIT (fsync) на все."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    else:
+        db.commit()
+
+def pool_stats():
+    return {'write': write_pool.stats(), 'read': read_pool.stats()}
+
+def close_pools():
+    """Закриває вільні з'єднання (перед fork або при зупинці)."""
+    write_pool.close_all()
+    read_pool.close_all()
+
+def get_generation(name):
+    """Поточне значення лічильника змін таблиці."""
+    row = get_db().execute('SELECT generation FROM table_generations WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+def get_generations(names):
+    """{назва таблиці: (generation, updated_at)} одним запитом."""
+    placeholders = ','.join('?' * len(names))
+    rows = get_db().execute(f'SELECT name, generation, updated_at FROM table_generations WHERE name IN ({placeholders})',
+                            tuple(names)).fetchall()
+    return {name: (generation, updated_at) for name, generation, updated_at in rows}
+
+def migrate_db():
+    """Оновлює існуючу БД до останньої версії схеми без втрати даних."""
+    db = sqlite3.connect(DATABASE)
+    try:
+        return migrate(db)
+    finally:
         db.close()
 
 def init_db():
@@ -32,7 +247,11 @@ def init_db():
             print(f"❌ ПОМИЛКА: Не знайдено {schema_path}")
             return
         
+        # Нова БД одразу з incremental vacuum: місце після архівування (retention.py) повертається без VACUUM
+        db.execute('PRAGMA auto_vacuum = INCREMENTAL')
         with open(schema_path, mode='r', encoding='utf-8') as f:
             db.cursor().executescript(f.read())
+        db.execute('PRAGMA user_version = 0')
         db.commit()
+        migrate(db)
     print(f"✅ База даних створена: {DATABASE}")
\ No newline at end of file
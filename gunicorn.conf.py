@@ -0,0 +1,47 @@
+# Продакшн-запуск: gunicorn -c gunicorn.conf.py app:app
+# Pre-fork воркери з потоками (gthread); всі параметри — через змінні оточення WEB_*.
+import multiprocessing
+import os
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Keep-alive довший за keepalive_timeout в upstream nginx, щоб nginx першим закривав з'єднання
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 75))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+# Скільки чекати завершення поточних запитів при HUP/TERM (drain)
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+# Плановий перезапуск воркерів проти витоків пам'яті
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 1000))
+
+# preload: код завантажується один раз у master і ділиться воркерами (copy-on-write).
+# Для перезавантаження коду через `kill -HUP` без рестарту контейнера встановіть WEB_PRELOAD=0.
+preload_app = os.environ.get('WEB_PRELOAD', '1') == '1'
+
+# Заголовки X-Forwarded-* (схема, хост -> url_for, secure cookie, редиректи) довіряємо лише від проксі.
+# За замовчуванням — лише локальний nginx; для nginx в іншому контейнері задайте його адресу
+# або мережу: WEB_FORWARDED_ALLOW_IPS=172.16.0.0/12
+forwarded_allow_ips = os.environ.get('WEB_FORWARDED_ALLOW_IPS', '127.0.0.1')
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+def on_starting(server):
+    # Ініціалізація/міграція БД один раз у master, до запуску воркерів
+    from app import app, init_db_on_startup
+    from db import close_pools
+    import assets
+    init_db_on_startup()
+    close_pools()
+    # Статика з хешами: збирається тут (ASSETS_BUILD_ON_START) або має бути зібрана заздалегідь
+    assets.prepare(app.static_folder)
+
+def post_fork(server, worker):
+    # Один потік воркера лишається для /api/v1/health і /api/v1/status (admission.py)
+    import admission
+    admission.reserve_lane(server.cfg.threads)
+    # Фоновий перенос старих замовлень і відгуків в архів, якщо задано RETENTION_INTERVAL (retention.py)
+    import retention
+    retention.start_background()
@@ -0,0 +1,147 @@
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from flask import has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+from db import get_db, close_db
+
+# KDF (scrypt/pbkdf2) свідомо важкий для CPU, тому виконується в окремих процесах,
+# а не в потоках запитів. HASH_WORKERS — процесів на кожен воркер gunicorn (усього WEB_WORKERS × HASH_WORKERS,
+# тож за замовчуванням 1 — інакше KDF-процесів стає в рази більше за ядра); 0 — рахувати в потоці запиту.
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', 1))
+HASH_QUEUE_MAX = int(os.environ.get('HASH_QUEUE_MAX', max(1, HASH_WORKERS) * 4))
+HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', 10))
+# Процеси хешування мають нижчий пріоритет, щоб звичайні запити не чекали на CPU
+HASH_NICE = int(os.environ.get('HASH_NICE', 10))
+# Поточні параметри хешування; старі хеші перераховуються при вдалому вході
+PASSWORD_METHOD = os.environ.get('PASSWORD_METHOD', 'scrypt:32768:8:1')
+
+class HashBusy(Exception):
+    """Черга хешування переповнена (429) або пул не відповідає (503)."""
+
+    def __init__(self, status, retry_after):
+        super().__init__('Сервер перевантажений, спробуйте пізніше.')
+        self.status = status
+        self.retry_after = retry_after
+
+def _lower_priority(increment):
+    try:
+        os.nice(increment)
+    except OSError:
+        pass
+
+class Hasher:
+    """Обмежений пул процесів для KDF із контролем допуску: не більше max_pending задач одночасно."""
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_QUEUE_MAX, timeout=HASH_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._avg_seconds = 0.05  # ковзне середнє тривалості однієї задачі
+        self.completed = self.rejected = 0
+
+    def _pool(self):
+        # Пул створюється ліниво в кожному воркері (після fork), як і пули з'єднань
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('forkserver'),
+                                                 initializer=_lower_priority, initargs=(HASH_NICE,))
+            self._pid = os.getpid()
+        return self._executor
+
+    def retry_after(self):
+        slots = max(1, self.workers)
+        return max(1, math.ceil(self._pending / slots * self._avg_seconds))
+
+    def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashBusy(429, self.retry_after())
+            self._pending += 1
+            pool = self._pool() if self.workers > 0 else None
+        # Поки запит чекає на KDF, його з'єднання з пулів БД потрібні іншим запитам
+        if has_app_context():
+            close_db()
+        started = time.perf_counter()
+        if pool is None:
+            try:
+                return fn(*args)
+            finally:
+                self._release(started)
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._release(None)
+            self._reset(pool)
+            raise HashBusy(503, self.retry_after())
+        # Слот звільняється, коли задача справді завершилась у пулі, а не коли запит перестав чекати
+        future.add_done_callback(lambda done: self._release(None if done.cancelled() else started))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Ще не почалась — знімається з черги; якщо вже рахується, слот зайнятий до її завершення
+            future.cancel()
+            raise HashBusy(503, self.retry_after())
+        except BrokenProcessPool:
+            self._reset(pool)
+            raise HashBusy(503, self.retry_after())
+
+    def _release(self, started):
+        with self._lock:
+            self._pending -= 1
+            if started is not None:
+                self.completed += 1
+                self._avg_seconds = self._avg_seconds * 0.9 + (time.perf_counter() - started) * 0.1
+
+    def _reset(self, pool):
+        with self._lock:
+            if self._executor is pool:
+                self._executor = None  # наступна задача підніме новий пул
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self._pending, 'max_pending': self.max_pending,
+                'completed': self.completed, 'rejected': self.rejected,
+                'avg_ms': round(self._avg_seconds * 1000, 2)}
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+
+hasher = Hasher()
+atexit.register(hasher.shutdown)
+
+def hash_password(password):
+    return hasher.run(generate_password_hash, password, PASSWORD_METHOD)
+
+def verify_password(stored, password):
+    return hasher.run(check_password_hash, stored, password)
+
+def needs_rehash(stored):
+    """True, якщо хеш створено з іншими параметрами, ніж PASSWORD_METHOD."""
+    return stored.split('$', 1)[0] != PASSWORD_METHOD
+
+def rehash(user_id, password):
+    """Перераховує хеш після вдалого входу; при перевантаженні просто відкладає це до наступного входу."""
+    try:
+        hashed = hash_password(password)
+    except HashBusy:
+        return False
+    db = get_db(readonly=False)
+    db.execute('UPDATE users SET password = ? WHERE id = ?', (hashed, user_id))
+    db.commit()
+    return True
+
+def init_app(app):
+    @app.errorhandler(HashBusy)
+    def handle_hash_busy(e):
+        return e.args[0], e.status, {'Retry-After': str(e.retry_after), 'Content-Type': 'text/plain; charset=utf-8'}
@@ -0,0 +1,287 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from flask import g, request, has_app_context, has_request_context, template_rendered, before_render_template
+from flask.sessions import SecureCookieSessionInterface
+
+# Межі бакетів гістограми затримок (секунди)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Запити до БД, довші за поріг, пишуться в лог sql.slow
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+# Каталог, куди кожен процес-воркер скидає свої лічильники для агрегації
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'stardew-metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+
+slow_log = logging.getLogger('sql.slow')
+
+_lock = threading.Lock()
+_started = time.time()
+
+def _empty():
+    return {'requests': {}, 'latency': {}, 'phase': {}, 'statements': {}, 'in_flight': {}, 'slow': 0}
+
+_data = _empty()
+_dirty = False
+_flusher_pid = None
+
+def _inc(table, key, value=1):
+    table[key] = table.get(key, 0) + value
+
+# --- ЗБІР ДАНИХ ЗАПИТУ ---
+def record_sql(sql, seconds, statement=True):
+    """Викликається з'єднанням БД для кожного виконання (statement=True) та вибірки."""
+    if has_app_context() and '_metrics_start' in g:
+        g._metrics_sql_count += statement
+        g._metrics_phase['sql'] += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        endpoint = request.endpoint if has_request_context() else None
+        slow_log.warning('%.1f ms [%s] %s', seconds * 1000, endpoint, ' '.join(sql.split()))
+        with _lock:
+            _data['slow'] += 1
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_endpoint = request.endpoint or 'unmatched'
+    g._metrics_method = request.method
+    g._metrics_sql_count = 0
+    g._metrics_phase = {'sql': 0.0, 'template': 0.0, 'session': 0.0}
+    with _lock:
+        _inc(_data['in_flight'], g._metrics_endpoint)
+
+def _after_request(response):
+    g._metrics_status = response.status_code
+    return response
+
+def _teardown(e=None):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    endpoint = g._metrics_endpoint
+    status = g.get('_metrics_status', 500)
+    with _lock:
+        _inc(_data['in_flight'], endpoint, -1)
+        _inc(_data['requests'], f'{endpoint}|{g._metrics_method}|{status}')
+        histogram = _data['latency'].setdefault(endpoint, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                histogram[i] += 1
+        histogram[-2] += elapsed
+        histogram[-1] += 1
+        _inc(_data['statements'], endpoint, g._metrics_sql_count)
+        for phase, seconds in g._metrics_phase.items():
+            _inc(_data['phase'], f'{endpoint}|{phase}', seconds)
+    _mark_dirty()
+
+def _template_started(sender, template, context, **extra):
+    if '_metrics_start' in g:
+        g._metrics_template_start = time.perf_counter()
+
+def _template_finished(sender, template, context, **extra):
+    started = g.pop('_metrics_template_start', None)
+    if started is not None:
+        g._metrics_phase['template'] += time.perf_counter() - started
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    """Стандартна cookie-сесія, але з обліком часу на розбір і підпис (HMAC)."""
+
+    def open_session(self, app, request):
+        started = time.perf_counter()
+        session = super().open_session(app, request)
+        g._metrics_session_open = time.perf_counter() - started
+        return session
+
+    def save_session(self, app, session, response):
+        started = time.perf_counter()
+        super().save_session(app, session, response)
+        if '_metrics_start' in g:
+            g._metrics_phase['session'] += time.perf_counter() - started + g.pop('_metrics_session_open', 0.0)
+
+def init_app(app):
+    app.session_interface = TimedSessionInterface()
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_appcontext(_teardown)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+# --- АГРЕГАЦІЯ МІЖ ПРОЦЕСАМИ ---
+def _snapshot():
+    from db import pool_stats
+    import writer
+    with _lock:
+        data = json.loads(json.dumps(_data))
+    data['pid'] = os.getpid()
+    data['pool'] = pool_stats()
+    data['writer'] = writer.stats()
+    return data
+
+def _mark_dirty():
+    # Фоновий потік скидає лічильники не частіше ніж раз на METRICS_FLUSH_SECONDS
+    # (запускається ліниво, щоб після fork у кожного воркера був свій)
+    global _dirty, _flusher_pid
+    _dirty = True
+    if _flusher_pid != os.getpid():
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+def _flush_loop():
+    global _dirty
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        if _dirty:
+            _dirty = False
+            try:
+                flush()
+            except OSError as e:
+                logging.getLogger(__name__).warning('Не вдалося записати метрики: %s', e)
+
+def flush():
+    """Атомарно записує лічильники цього процесу у METRICS_DIR/<pid>-<старт>.json."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}-{int(_started * 1000)}.json')
+    tmp = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp, path)
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merge(total, data, live):
+    for table in ('requests', 'statements', 'phase'):
+        for key, value in data[table].items():
+            _inc(total[table], key, value)
+    for key, histogram in data['latency'].items():
+        merged = total['latency'].setdefault(key, [0] * len(histogram))
+        for i, value in enumerate(histogram):
+            merged[i] += value
+    total['slow'] += data['slow']
+    if live:
+        for key, value in data['in_flight'].items():
+            _inc(total['in_flight'], key, value)
+        for kind, stats in data.get('pool', {}).items():
+            pool = total.setdefault('pool', {}).setdefault(kind, {})
+            for key, value in stats.items():
+                _inc(pool, key, value)
+        stats = data.get('writer', {})
+        if stats:
+            merged = total.setdefault('writer', {'batch_sizes': {}})
+            for key, value in stats.items():
+                if key == 'batch_sizes':
+                    for bound, count in value.items():
+                        _inc(merged['batch_sizes'], bound, count)
+                elif key in ('batch_max', 'queue_high_water'):
+                    merged[key] = max(merged.get(key, 0), value)
+                else:
+                    _inc(merged, key, value)
+
+def collect():
+    """Сума лічильників усіх процесів; файли завершених процесів зливаються в archived.json."""
+    flush()
+    total = _empty()
+    with open(os.path.join(METRICS_DIR, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(METRICS_DIR, 'archived.json')
+        archived = _empty()
+        if os.path.exists(archive_path):
+            with open(archive_path) as f:
+                archived = json.load(f)
+        dead = []
+        for path in glob.glob(os.path.join(METRICS_DIR, '*-*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if _alive(data['pid']):
+                _merge(total, data, live=True)
+            else:
+                _merge(archived, data, live=False)
+                dead.append(path)
+        if dead:
+            tmp = f'{archive_path}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(archived, f)
+            os.replace(tmp, archive_path)
+            for path in dead:
+                os.remove(path)
+    _merge(total, archived, live=False)
+    return total
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+def render_prometheus():
+    """Метрики у текстовому форматі Prometheus 0.0.4."""
+    data = collect()
+    lines = [
+        '# HELP http_requests_total Кількість оброблених запитів.',
+        '# TYPE http_requests_total counter',
+    ]
+    for key, value in sorted(data['requests'].items()):
+        endpoint, method, status = key.split('|')
+        lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {value}')
+    lines += ['# HELP http_request_duration_seconds Час обробки запиту.',
+              '# TYPE http_request_duration_seconds histogram']
+    for endpoint, histogram in sorted(data['latency'].items()):
+        for bound, count in zip(BUCKETS, histogram):
+            lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {histogram[-1]}')
+        lines.append(f'http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {histogram[-2]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{_labels(endpoint=endpoint)} {histogram[-1]}')
+    lines += ['# HELP http_requests_in_flight Запити, що обробляються зараз.',
+              '# TYPE http_requests_in_flight gauge']
+    for endpoint, value in sorted(data['in_flight'].items()):
+        lines.append(f'http_requests_in_flight{_labels(endpoint=endpoint)} {value}')
+    lines += ['# HELP http_request_phase_seconds_total Час запиту за фазами (sql, template, session).',
+              '# TYPE http_request_phase_seconds_total counter']
+    for key, value in sorted(data['phase'].items()):
+        endpoint, phase = key.split('|')
+        lines.append(f'http_request_phase_seconds_total{_labels(endpoint=endpoint, phase=phase)} {value:.6f}')
+    lines += ['# HELP db_statements_total SQL-запити, виконані під час обробки.',
+              '# TYPE db_statements_total counter']
+    for endpoint, value in sorted(data['statements'].items()):
+        lines.append(f'db_statements_total{_labels(endpoint=endpoint)} {value}')
+    lines += ['# HELP db_slow_statements_total SQL-запити, довші за SLOW_QUERY_MS.',
+              '# TYPE db_slow_statements_total counter',
+              f'db_slow_statements_total {data["slow"]}']
+    lines += ['# HELP db_pool_connections Стан пулів з\'єднань усіх живих воркерів.',
+              '# TYPE db_pool_connections gauge']
+    for kind, stats in sorted(data.get('pool', {}).items()):
+        for key, value in sorted(stats.items()):
+            lines.append(f'db_pool_connections{_labels(pool=kind, stat=key)} {value}')
+    stats = data.get('writer')
+    if stats:
+        lines += ['# HELP db_write_batch_size Кількість задач в одному груповому коміті (writer.py).',
+                  '# TYPE db_write_batch_size histogram']
+        cumulative = 0
+        for bound, count in stats['batch_sizes'].items():
+            cumulative += count
+            lines.append(f'db_write_batch_size_bucket{_labels(le=bound)} {cumulative}')
+        lines += [f'db_write_batch_size_sum {stats["jobs"]}',
+                  f'db_write_batch_size_count {stats["batches"]}',
+                  '# HELP db_write_failed_total Задачі запису, що завершились помилкою.',
+                  '# TYPE db_write_failed_total counter',
+                  f'db_write_failed_total {stats["failed"]}',
+                  '# HELP db_write_commit_seconds_total Сумарний час групових комітів.',
+                  '# TYPE db_write_commit_seconds_total counter',
+                  f'db_write_commit_seconds_total {stats["commit_seconds"]:.6f}',
+                  '# HELP db_write_queue_depth Задачі, що чекають у черзі запису.',
+                  '# TYPE db_write_queue_depth gauge',
+                  f'db_write_queue_depth {stats["queue_depth"]}',
+                  '# HELP db_write_queue_high_water Найбільша глибина черги запису з моменту старту воркера.',
+                  '# TYPE db_write_queue_high_water gauge',
+                  f'db_write_queue_high_water {stats["queue_high_water"]}']
+    return '\n'.join(lines) + '\n'
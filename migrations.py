@@ -0,0 +1,221 @@
+import re
+import sqlite3
+
+def _generation_triggers(table):
+    """Рядок у table_generations і тригери, що збільшують його при будь-якому записі в таблицю."""
+    sql = f"INSERT OR IGNORE INTO table_generations (name) VALUES ('{table}');\n"
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        sql += f"""CREATE TRIGGER IF NOT EXISTS {table}_gen_{event.lower()} AFTER {event} ON {table} BEGIN
+    UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = '{table}';
+END;
+"""
+    return sql
+
+FTS_TOKENIZE = "unicode61 remove_diacritics 2 tokenchars '''ʼ’'"
+
+def _fts_table(table, columns):
+    """External-content таблиця FTS5 над table, тригери синхронізації та початкове наповнення."""
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    return f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+    {cols}, content='{table}', content_rowid='id', tokenize="{FTS_TOKENIZE}", prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts (rowid, {cols}) VALUES (new.id, {new});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, {cols}) VALUES ('delete', old.id, {old});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {cols} ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, {cols}) VALUES ('delete', old.id, {old});
+    INSERT INTO {table}_fts (rowid, {cols}) VALUES (new.id, {new});
+END;
+INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild');
+"""
+
+# Версія схеми зберігається у PRAGMA user_version; schema.sql — це версія 0.
+# Нові зміни додаються лише в кінець списку, старі міграції не редагуються.
+MIGRATIONS = [
+    # 1. Лічильники змін таблиць: тригери збільшують generation при кожному записі,
+    #    тож кожен воркер може дешево перевірити, чи застарів його кеш.
+    (1, """
+CREATE TABLE IF NOT EXISTS table_generations (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO table_generations (name) VALUES ('products');
+CREATE TRIGGER IF NOT EXISTS products_gen_insert AFTER INSERT ON products BEGIN
+    UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'products';
+END;
+CREATE TRIGGER IF NOT EXISTS products_gen_update AFTER UPDATE ON products BEGIN
+    UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'products';
+END;
+CREATE TRIGGER IF NOT EXISTS products_gen_delete AFTER DELETE ON products BEGIN
+    UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'products';
+END;
+"""),
+    # 2. Індекси під гарячі запити (стрічка відгуків, фільтр категорій, історія замовлень)
+    (2, """
+CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback (created_at);
+CREATE INDEX IF NOT EXISTS idx_products_category ON products (category);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at, user_id, total_price);
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id, product_id, quantity);
+"""),
+    # 3. Keyset-пагінація замовлень по (created_at, id) без сортування в тимчасовому B-дереві
+    (3, """
+DROP INDEX IF EXISTS idx_orders_created;
+CREATE INDEX IF NOT EXISTS idx_orders_keyset ON orders (created_at, id, user_id, total_price);
+"""),
+    # 4. Лічильники змін для відгуків і замовлень (валідатори ETag)
+    (4, _generation_triggers('feedback') + _generation_triggers('orders')),
+    # 5. Серверні кошики (cart_store.py): у cookie лишається тільки id кошика
+    (5, """
+CREATE TABLE IF NOT EXISTS carts (
+    id TEXT PRIMARY KEY,
+    items TEXT NOT NULL DEFAULT '',
+    item_count INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_carts_updated ON carts (updated_at);
+"""),
+    # 6. Лічильник змін users: кеш користувачів у воркерах (principal.py) скидається при зміні ролі чи пароля
+    (6, """
+INSERT OR IGNORE INTO table_generations (name) VALUES ('users');
+CREATE TRIGGER IF NOT EXISTS users_gen_update AFTER UPDATE OF username, email, password, role ON users BEGIN
+    UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'users';
+END;
+CREATE TRIGGER IF NOT EXISTS users_gen_delete AFTER DELETE ON users BEGIN
+    UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'users';
+END;
+"""),
+    # 7. Зведені таблиці продажів (stats.py): тригери оновлюють їх при кожному новому замовленні.
+    #    order_items не зберігає ціну, тому виручка рахується за ціною товару на момент вставки.
+    (7, """
+INSERT OR IGNORE INTO table_generations (name) VALUES ('sales');
+CREATE TABLE IF NOT EXISTS sales_by_product (
+    product_id INTEGER PRIMARY KEY,
+    order_lines INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sales_product_revenue ON sales_by_product (revenue);
+CREATE INDEX IF NOT EXISTS idx_sales_product_units ON sales_by_product (units);
+CREATE TABLE IF NOT EXISTS sales_by_category (
+    category TEXT PRIMARY KEY,
+    order_lines INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sales_by_day (
+    day TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS orders_sales_insert AFTER INSERT ON orders BEGIN
+    INSERT INTO sales_by_day (day, orders, revenue) VALUES (date(NEW.created_at), 1, NEW.total_price)
+    ON CONFLICT (day) DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue;
+END;
+CREATE TRIGGER IF NOT EXISTS order_items_sales_insert AFTER INSERT ON order_items BEGIN
+    INSERT INTO sales_by_product (product_id, order_lines, units, revenue)
+    VALUES (NEW.product_id, 1, NEW.quantity,
+            NEW.quantity * COALESCE((SELECT price FROM products WHERE id = NEW.product_id), 0))
+    ON CONFLICT (product_id) DO UPDATE SET order_lines = order_lines + 1, units = units + excluded.units,
+        revenue = revenue + excluded.revenue;
+    INSERT INTO sales_by_category (category, order_lines, units, revenue)
+    SELECT category, 1, NEW.quantity, NEW.quantity * price FROM products WHERE id = NEW.product_id
+    ON CONFLICT (category) DO UPDATE SET order_lines = order_lines + 1, units = units + excluded.units,
+        revenue = revenue + excluded.revenue;
+    UPDATE sales_by_day SET units = units + NEW.quantity
+    WHERE day = (SELECT date(created_at) FROM orders WHERE id = NEW.order_id);
+END;
+"""),
+    # 8. Повнотекстовий пошук (search.py). unicode61 знижує регістр кирилиці, remove_diacritics 2
+    #    прибирає наголоси, апостроф входить у слово (п'єр); prefix='2 3' пришвидшує пошук за префіксом.
+    (8, _fts_table('products', ('name', 'category')) + _fts_table('feedback', ('text',))),
+    # 9. Масовий імпорт (product_import.py) оновлює переважно ціни: індекс FTS перебудовується
+    #    лише коли справді змінилась назва чи категорія
+    (9, """
+DROP TRIGGER IF EXISTS products_fts_update;
+CREATE TRIGGER products_fts_update AFTER UPDATE OF name, category ON products
+WHEN old.name IS NOT new.name OR old.category IS NOT new.category BEGIN
+    INSERT INTO products_fts (products_fts, rowid, name, category) VALUES ('delete', old.id, old.name, old.category);
+    INSERT INTO products_fts (rowid, name, category) VALUES (new.id, new.name, new.category);
+END;
+"""),
+    # 10. Історія замовлень користувача (/users/me/orders) по (created_at, id) без сортування
+    (10, """
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id, created_at, id);
+"""),
+]
+
+# Запити, які мають іти через індекс (перевіряється командою `flask check-plans`).
+# all_* — TEMP-представлення робоча БД + архів (retention.attach)
+HOT_QUERIES = {
+    'feedback_page': 'SELECT * FROM all_feedback ORDER BY created_at DESC, id DESC LIMIT ?',
+    'feedback_page_after': '''
+        SELECT * FROM all_feedback WHERE (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC LIMIT ?''',
+    'products_by_category': 'SELECT * FROM products WHERE category = ?',
+    'orders_page': '''
+        SELECT o.id, o.total_price, o.created_at, u.username
+        FROM all_orders o
+        CROSS JOIN users u ON o.user_id = u.id
+        ORDER BY o.created_at DESC, o.id DESC LIMIT ?''',
+    'orders_page_after': '''
+        SELECT o.id, o.total_price, o.created_at, u.username
+        FROM all_orders o
+        CROSS JOIN users u ON o.user_id = u.id
+        WHERE (o.created_at, o.id) < (?, ?)
+        ORDER BY o.created_at DESC, o.id DESC LIMIT ?''',
+    'order_items_by_order': 'SELECT product_id, quantity FROM order_items WHERE order_id = ?',
+    'orders_by_user': '''
+        SELECT o.id, o.created_at FROM all_orders o WHERE o.user_id = ?
+        ORDER BY o.created_at DESC, o.id DESC LIMIT ?''',
+    'retention_oldest_orders': 'SELECT id FROM main.orders WHERE created_at < ? ORDER BY created_at, id LIMIT ?',
+    'retention_oldest_feedback': 'SELECT id FROM main.feedback WHERE created_at < ? ORDER BY created_at, id LIMIT ?',
+    'user_by_credentials': 'SELECT * FROM users WHERE username = ? AND email = ?',
+    'user_by_id': 'SELECT * FROM users WHERE id = ?',
+    'cart_by_id': 'SELECT item_count, updated_at FROM carts WHERE id = ?',
+    'carts_expired': 'SELECT id FROM carts WHERE updated_at < ?',
+    'sales_top_products': 'SELECT product_id, order_lines, units, revenue FROM sales_by_product ORDER BY revenue DESC LIMIT ?',
+    'search_product_ids': "SELECT rowid FROM products_fts WHERE products_fts MATCH ?",
+    'sales_daily': 'SELECT * FROM sales_by_day WHERE day BETWEEN ? AND ? ORDER BY day',
+}
+
+def migrate(db):
+    """Застосовує міграції новіші за user_version; повертає список застосованих версій."""
+    current = db.execute('PRAGMA user_version').fetchone()[0]
+    applied = []
+    for version, sql in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            db.executescript(f'BEGIN IMMEDIATE;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;')
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        applied.append(version)
+    if applied:
+        db.execute('ANALYZE')
+    db.execute('PRAGMA optimize')
+    return applied
+
+def _is_scan(detail):
+    # "SCAN feedback" — повний прохід таблиці; "SCAN f USING INDEX ..." — впорядкований прохід індексу.
+    # AUTOMATIC INDEX означає, що SQLite будує тимчасовий індекс під час кожного запиту.
+    return (bool(re.match(r'SCAN \S+$', detail)) or detail.startswith('USE TEMP B-TREE')
+            or 'AUTOMATIC' in detail)
+
+def check_query_plans(db):
+    """Повертає {назва запиту: [рядки плану з повним скануванням]} для проблемних запитів."""
+    problems = {}
+    for name, sql in HOT_QUERIES.items():
+        params = (None,) * sql.count('?')
+        plan = db.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        scans = [row[3] for row in plan if _is_scan(row[3])]
+        if scans:
+            problems[name] = scans
+    return problems
@@ -0,0 +1,92 @@
+import os
+import retention
+
+# Максимум замовлень в одному запиті /orders/bulk
+BULK_ORDERS_MAX = int(os.environ.get('BULK_ORDERS_MAX', 1000))
+# Розмір IN-списку (ліміт SQLite на кількість параметрів)
+IN_CHUNK = 500
+
+# Історія замовлень одним запитом: товари кожного замовлення збираються в JSON-масив корельованим
+# підзапитом. Він іде окремо по робочій БД і архіву (retention.py): через представлення all_order_items
+# SQLite не переносить умову order_id = o.id всередину UNION ALL і сканує всю таблицю.
+# order_items не зберігає ціну, тож price — поточна ціна товару (null, якщо товар видалено).
+_ITEMS = """SELECT json_object('product_id', i.product_id, 'name', p.name, 'price', p.price,
+                                  'quantity', i.quantity) AS item
+                FROM {schema}.order_items i LEFT JOIN products p ON p.id = i.product_id WHERE i.order_id = o.id"""
+ORDER_HISTORY_SQL = f"""
+    SELECT o.id, o.user_id, u.username, o.total_price, o.status, o.created_at,
+        (SELECT json_group_array(json(item)) FROM ({_ITEMS.format(schema='main')}
+            UNION ALL {_ITEMS.format(schema='archive')})) AS items
+    FROM all_orders o
+    LEFT JOIN users u ON u.id = o.user_id
+    WHERE {{where}}
+    ORDER BY o.created_at DESC, o.id DESC
+    LIMIT ?"""
+
+def _chunks(seq, size):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def parse_items(items):
+    """[{product_id, quantity}] -> [(product_id, quantity)]; ValueError при некоректних даних."""
+    if not isinstance(items, list) or not items:
+        raise ValueError("Список товарів порожній")
+    parsed = []
+    for item in items:
+        try:
+            product_id, quantity = int(item['product_id']), int(item['quantity'])
+        except (TypeError, KeyError, ValueError):
+            raise ValueError("Кожен товар потребує product_id та quantity")
+        if quantity < 1:
+            raise ValueError("Кількість має бути додатною")
+        parsed.append((product_id, quantity))
+    return parsed
+
+def fetch_prices(db, product_ids):
+    """{product_id: price} одним запитом на кожні IN_CHUNK товарів."""
+    prices = {}
+    for chunk in _chunks(set(product_ids), IN_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        prices.update(db.execute(f'SELECT id, price FROM products WHERE id IN ({placeholders})', chunk).fetchall())
+    return prices
+
+def find_users(db, credentials):
+    """{(username, email): user_id} для набору пар логін/email."""
+    found = {}
+    for chunk in _chunks({username for username, _ in credentials}, IN_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        for user_id, username, email in db.execute(
+                f'SELECT id, username, email FROM users WHERE username IN ({placeholders})', chunk):
+            found[(username, email)] = user_id
+    return {pair: found[pair] for pair in credentials if pair in found}
+
+def insert_orders(db, orders, prices):
+    """Записує [(user_id, items)] у відкритій транзакції; повертає [(order_id, total)].
+
+    Товари без ціни не враховуються в сумі, але зберігаються в order_items (як і раніше).
+    """
+    created = []
+    item_rows = []
+    for user_id, items in orders:
+        total = sum(prices[product_id] * quantity for product_id, quantity in items if product_id in prices)
+        order_id = db.execute('INSERT INTO orders (user_id, total_price) VALUES (?, ?)', (user_id, total)).lastrowid
+        item_rows.extend((order_id, product_id, quantity) for product_id, quantity in items)
+        created.append((order_id, total))
+    db.executemany('INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)', item_rows)
+    return created
+
+def order_history(db, limit, cursor=None, user_id=None, order_id=None):
+    """Курсор замовлень (нові спочатку) з товарами в колонці items (JSON); cursor — (created_at, id)."""
+    conditions, params = [], []
+    if order_id is not None:
+        conditions.append('o.id = ?')
+        params.append(order_id)
+    if user_id is not None:
+        conditions.append('o.user_id = ?')
+        params.append(user_id)
+    if cursor:
+        conditions.append('(o.created_at, o.id) < (?, ?)')
+        params.extend(cursor)
+    retention.attach(db)
+    return db.execute(ORDER_HISTORY_SQL.format(where=' AND '.join(conditions) or '1'), (*params, limit))
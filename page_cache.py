@@ -0,0 +1,52 @@
+import threading
+from flask import current_app, g, render_template, session
+from markupsafe import Markup
+from conditional import current_build
+
+# Кеш сторінок, вміст яких не залежить від користувача (головна, гайди, мапа...).
+# Блоки title/content рендеряться один раз на збірку, а шапка з користувачем, кошиком
+# і flash-повідомленнями (base.html) збирається навколо них через оболонку page.html.
+# Анонімам без flash-повідомлень уся сторінка однакова — її HTML кешується повністю.
+SHELL = 'page.html'
+_blocks = {}
+_pages = {}
+_build = None
+_lock = threading.Lock()
+
+def _render_blocks(name):
+    template = current_app.jinja_env.get_template(name)
+    context = {}
+    current_app.update_template_context(context)
+    context = template.new_context(context)
+
+    def block(block_name):
+        render = template.blocks.get(block_name)
+        return None if render is None else Markup(''.join(render(context)))
+
+    return block('title'), block('content')
+
+def _check_build():
+    # Нова збірка (у debug — змінені шаблони) скидає обидва кеші
+    global _build
+    build_id = current_build()[0]
+    if build_id != _build:
+        with _lock:
+            if build_id != _build:
+                _blocks.clear()
+                _pages.clear()
+                _build = build_id
+
+def render_page(name):
+    """Як render_template(name) для сторінок зі статичним вмістом і персональною шапкою."""
+    _check_build()
+    anonymous = '_flashes' not in session and g.user is None
+    if anonymous and name in _pages:
+        return _pages[name]
+    blocks = _blocks.get(name)
+    if blocks is None:
+        blocks = _blocks[name] = _render_blocks(name)
+    title, body = blocks
+    html = render_template(SHELL, page_title=title, page_body=body)
+    if anonymous:
+        _pages[name] = html
+    return html
@@ -0,0 +1,59 @@
+import base64
+import binascii
+import json
+import os
+from flask import request, url_for
+
+# Розмір сторінки за замовчуванням і жорстка межа для ?limit=
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 200))
+
+# Тип елемента ключа для числових значень, що можуть бути і цілими, і дробовими (bm25)
+NUMBER = (int, float)
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(*values):
+    """Непрозорий токен з ключа останнього рядка сторінки."""
+    raw = json.dumps(values, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def decode_cursor(token, types):
+    """Значення ключа з токена; types — тип кожного елемента (підроблений cursor дає 400, а не 500)."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor('Некоректний cursor')
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidCursor('Некоректний cursor')
+    # bool — підклас int, але ключем сторінки не буває
+    if any(isinstance(value, bool) or not isinstance(value, kind) for value, kind in zip(values, types)):
+        raise InvalidCursor('Некоректний cursor')
+    return values
+
+def page_args(*types):
+    """Повертає (limit, cursor) з query-параметрів; cursor — список значень ключа (типів types) або None."""
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    token = request.args.get('cursor')
+    return limit, (decode_cursor(token, types) if token else None)
+
+def split_page(rows, limit, key):
+    """Відрізає зайвий (limit + 1)-й рядок; повертає (сторінка, next_cursor або None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+def page_headers(next_cursor):
+    """X-Next-Cursor та Link: rel="next" для JSON-списків (тіло лишається масивом)."""
+    if next_cursor is None:
+        return {}
+    args = dict(request.args, cursor=next_cursor)
+    next_url = url_for(request.endpoint, **request.view_args, **args)
+    return {'X-Next-Cursor': next_cursor, 'Link': f'<{next_url}>; rel="next"'}
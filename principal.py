@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import session
+from flask.ctx import _AppCtxGlobals
+from db import get_db, get_generation
+
+# Кеш користувачів у кожному воркері: LRU на USER_CACHE_SIZE записів, запис живе USER_CACHE_TTL секунд.
+# Лічильник змін users (тригери міграції 6) перевіряється не частіше ніж раз на USER_CACHE_CHECK секунд.
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_CHECK = float(os.environ.get('USER_CACHE_CHECK', 1))
+
+class UserCache:
+    """Обмежений LRU-кеш рядків users із TTL; скидається повністю, коли змінюється generation таблиці."""
+
+    def __init__(self, max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, check_interval=USER_CACHE_CHECK):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._users = OrderedDict()  # user_id -> (користувач, час завантаження)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._next_check = 0
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        generation = get_generation('users')
+        with self._lock:
+            self._next_check = now + self.check_interval
+            if generation != self._generation:
+                self._users.clear()
+                self._generation = generation
+
+    def get(self, user_id):
+        self._check_generation()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[1] > now - self.ttl:
+                self._users.move_to_end(user_id)
+                return entry[0]
+        row = get_db().execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        with self._lock:
+            self._users[user_id] = (user, now)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id=None):
+        """Локально скидає одного користувача (або весь кеш); інші воркери побачать новий generation."""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+users = UserCache()
+
+def current_user():
+    user_id = session.get('user_id')
+    return None if user_id is None else users.get(user_id)
+
+# Ледачі атрибути g: значення обчислюється при першому зверненні й далі лежить у g як звичайне
+_loaders = {'user': current_user}
+
+def lazy_global(name):
+    """Реєструє функцію, що обчислює g.<name> при першому зверненні."""
+    def decorator(loader):
+        _loaders[name] = loader
+        return loader
+    return decorator
+
+class LazyGlobals(_AppCtxGlobals):
+    """flask.g, у якому g.user та інші зареєстровані атрибути завантажуються лише за потреби."""
+
+    def __getattr__(self, name):
+        loader = _loaders.get(name)
+        if loader is None:
+            return super().__getattr__(name)
+        value = loader()
+        setattr(self, name, value)
+        return value
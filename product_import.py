@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+import math
+import os
+from db import transaction
+
+# Масовий імпорт каталогу: рядки читаються з потоку запиту по одному, перевіряються
+# і записуються пачками по IMPORT_CHUNK в окремих транзакціях (executemany).
+IMPORT_CHUNK = int(os.environ.get('PRODUCTS_IMPORT_CHUNK', 2000))
+# Скільки помилок повертати у відповіді (решта лише рахується)
+IMPORT_MAX_ERRORS = int(os.environ.get('PRODUCTS_IMPORT_MAX_ERRORS', 1000))
+DEFAULT_CATEGORY = 'General'
+
+class ImportAborted(Exception):
+    """Потік неможливо читати далі (зламане кодування або CSV)."""
+
+def read_csv(stream):
+    """(номер рядка, dict) з CSV із заголовком; перевірка колонок — до першого рядка даних."""
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    try:
+        fieldnames = reader.fieldnames or []
+        missing = [column for column in ('name', 'price') if column not in fieldnames]
+        if missing:
+            raise ImportAborted(f"У заголовку CSV бракує колонок: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportAborted(f'Файл не вдалося дочитати: {e}')
+
+def read_ndjson(stream):
+    """(номер рядка, dict або ValueError) з NDJSON; порожні рядки пропускаються."""
+    # Без буфера readline сирого потоку WSGI читає по одному байту
+    for line_no, line in enumerate(io.BufferedReader(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except (UnicodeDecodeError, ValueError):
+            yield line_no, ValueError('Некоректний JSON')
+            continue
+        yield line_no, row if isinstance(row, dict) else ValueError('Рядок має бути JSON-об\'єктом')
+
+def parse_product(row):
+    """dict -> (id або None, name, price, category, image); ValueError з поясненням."""
+    if isinstance(row, Exception):
+        raise row
+    product_id = row.get('id')
+    if product_id in (None, ''):
+        product_id = None
+    else:
+        try:
+            if isinstance(product_id, (bool, float)):
+                raise ValueError
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError('id має бути цілим числом')
+        if product_id < 1:
+            raise ValueError('id має бути додатним')
+    name = row.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Відсутня назва товару")
+    price = row.get('price')
+    try:
+        if isinstance(price, bool):
+            raise ValueError
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError('price має бути числом')
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("Ціна не може бути від'ємною")
+    category = row.get('category') or DEFAULT_CATEGORY
+    image = row.get('image') or ''
+    if not isinstance(category, str) or not isinstance(image, str):
+        raise ValueError('category та image мають бути рядками')
+    return product_id, name.strip(), price, category.strip(), image.strip()
+
+def _write_chunk(db, rows):
+    """Одна транзакція: без id — INSERT, з id — upsert; повертає (створено, оновлено, без змін)."""
+    with_id = [row for row in rows if row[0] is not None]
+    without_id = [row[1:] for row in rows if row[0] is None]
+    created = len(without_id)
+    changed = 0
+    with transaction(db):
+        if with_id:
+            ids = json.dumps([row[0] for row in with_id])
+            existing = {product_id for (product_id,) in db.execute(
+                'SELECT id FROM products WHERE id IN (SELECT value FROM json_each(?))', (ids,))}
+            # Рядки без змін не переписуються (і не чіпають тригери generation та FTS)
+            changed = db.executemany('''
+                INSERT INTO products (id, name, price, category, image) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET name = excluded.name, price = excluded.price,
+                    category = excluded.category, image = excluded.image
+                WHERE name <> excluded.name OR price <> excluded.price
+                    OR category <> excluded.category OR image <> excluded.image''', with_id).rowcount
+            # Повторний id у тому ж файлі — вже не новий товар
+            for product_id, *_ in with_id:
+                if product_id not in existing:
+                    created += 1
+                    existing.add(product_id)
+        if without_id:
+            db.executemany('INSERT INTO products (name, price, category, image) VALUES (?, ?, ?, ?)', without_id)
+    updated = changed - (created - len(without_id))
+    return created, updated, len(with_id) - (created - len(without_id)) - updated
+
+def import_products(db, rows, chunk_size=IMPORT_CHUNK):
+    """Імпортує [(номер рядка, dict)]; некоректні рядки пропускаються і потрапляють у errors."""
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+    chunk = []
+
+    def flush():
+        created, updated, unchanged = _write_chunk(db, chunk)
+        result['created'] += created
+        result['updated'] += updated
+        result['unchanged'] += unchanged
+        chunk.clear()
+
+    def fail(line, message):
+        result['failed'] += 1
+        if len(result['errors']) < IMPORT_MAX_ERRORS:
+            result['errors'].append({'line': line, 'error': message})
+
+    try:
+        for line, row in rows:
+            try:
+                chunk.append(parse_product(row))
+            except ValueError as e:
+                fail(line, str(e))
+                continue
+            if len(chunk) >= chunk_size:
+                flush()
+    except ImportAborted as e:
+        result['aborted'] = str(e)
+    if chunk:
+        flush()
+    return result
@@ -0,0 +1,193 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from db import DATABASE, DB_JOURNAL_MODE, connect, transaction
+
+# Гаряче/холодне зберігання: замовлення і відгуки, старші за RETENTION_DAYS, переносяться
+# пачками в окремий файл SQLite (архів). Читання історії йде через TEMP-представлення
+# all_orders / all_order_items / all_feedback = робоча БД UNION ALL архів (ATTACH ... AS archive),
+# тож робоча БД (її індекси, кеш сторінок, бекапи) містить лише свіжі дані.
+ARCHIVE_DATABASE = os.environ.get('ARCHIVE_DATABASE_PATH', os.path.splitext(DATABASE)[0] + '-archive.db')
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 365))
+RETENTION_BATCH = int(os.environ.get('RETENTION_BATCH', 1000))
+# Пауза між пачками, щоб запити на запис встигали взяти блокування
+RETENTION_PAUSE_MS = float(os.environ.get('RETENTION_PAUSE_MS', 20))
+# Сторінок за один крок PRAGMA incremental_vacuum
+RETENTION_VACUUM_PAGES = int(os.environ.get('RETENTION_VACUUM_PAGES', 2000))
+# Фоновий перенос у воркерах gunicorn раз на N секунд (0 — лише `flask archive`)
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 0))
+
+COLUMNS = {
+    'orders': ('id', 'user_id', 'total_price', 'status', 'created_at'),
+    'order_items': ('id', 'order_id', 'product_id', 'quantity'),
+    'feedback': ('id', 'username', 'text', 'rating', 'created_at'),
+}
+# Таблиці, що архівуються за created_at, та їхні дочірні таблиці (переносяться разом з батьківськими рядками)
+ARCHIVED = {'orders': ('order_items', 'order_id'), 'feedback': None}
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive.orders (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    total_price REAL NOT NULL,
+    status TEXT,
+    created_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS archive.order_items (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER
+);
+CREATE TABLE IF NOT EXISTS archive.feedback (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    text TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    created_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS archive.idx_orders_keyset ON orders (created_at, id, user_id, total_price);
+CREATE INDEX IF NOT EXISTS archive.idx_order_items_order ON order_items (order_id, product_id, quantity);
+CREATE INDEX IF NOT EXISTS archive.idx_feedback_created ON feedback (created_at);
+CREATE INDEX IF NOT EXISTS archive.idx_orders_user ON orders (user_id, created_at, id);
+"""
+
+def _views():
+    sql = ''
+    for table, columns in COLUMNS.items():
+        cols = ', '.join(columns)
+        sql += f"""CREATE TEMP VIEW IF NOT EXISTS all_{table} AS
+    SELECT {cols} FROM main.{table} UNION ALL SELECT {cols} FROM archive.{table};
+"""
+    return sql
+
+def attach(db):
+    """Підключає архів до з'єднання (один раз за його життя в пулі); повертає те саме з'єднання."""
+    if getattr(db, 'archive_attached', False):
+        return db
+    readonly = getattr(db, 'readonly', False)
+    db.execute('ATTACH DATABASE ? AS archive', (ARCHIVE_DATABASE,))
+    # TEMP-представлення (і схема нового архіву) — теж запис, навіть для read-only з'єднання
+    db.execute('PRAGMA query_only = OFF')
+    try:
+        db.execute(f'PRAGMA archive.journal_mode = {DB_JOURNAL_MODE}').fetchall()
+        db.executescript(ARCHIVE_SCHEMA + _views())
+    finally:
+        if readonly:
+            db.execute('PRAGMA query_only = ON')
+    db.archive_attached = True
+    return db
+
+def cutoff_for(days, now=None):
+    """Межа created_at (UTC, формат CURRENT_TIMESTAMP) для рядків, старших за days днів."""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+def move_batch(db, table, cutoff, limit=RETENTION_BATCH):
+    """Переносить до limit найстаріших рядків table (з дочірніми); повертає {таблиця: кількість}."""
+    child = ARCHIVED[table]
+    cols = ', '.join(COLUMNS[table])
+    # Спершу копія в архів і коміт, потім видалення з робочої БД. Між файлами в режимі WAL
+    # спільна транзакція не атомарна, а так після збою рядок лишиться в обох місцях
+    # (і наступний запуск перенесе його повторно), але не зникне.
+    with transaction(db):
+        ids = json.dumps([row[0] for row in db.execute(
+            f'SELECT id FROM main.{table} WHERE created_at < ? ORDER BY created_at, id LIMIT ?', (cutoff, limit))])
+        moved = {table: db.execute(f'''INSERT OR REPLACE INTO archive.{table} ({cols})
+            SELECT {cols} FROM main.{table} WHERE id IN (SELECT value FROM json_each(?))''', (ids,)).rowcount}
+        if child:
+            child_table, key = child
+            child_cols = ', '.join(COLUMNS[child_table])
+            moved[child_table] = db.execute(f'''INSERT OR REPLACE INTO archive.{child_table} ({child_cols})
+                SELECT {child_cols} FROM main.{child_table} WHERE {key} IN (SELECT value FROM json_each(?))''',
+                (ids,)).rowcount
+    if not moved[table]:
+        return moved
+    with transaction(db):
+        if child:
+            db.execute(f'DELETE FROM main.{child_table} WHERE {key} IN (SELECT value FROM json_each(?))', (ids,))
+        db.execute(f'DELETE FROM main.{table} WHERE id IN (SELECT value FROM json_each(?))', (ids,))
+    return moved
+
+def incremental_vacuum(db, pages=RETENTION_VACUUM_PAGES, pause=RETENTION_PAUSE_MS / 1000):
+    """Повертає вільні сторінки файлу ОС кроками по pages; None, якщо auto_vacuum не INCREMENTAL."""
+    if db.execute('PRAGMA main.auto_vacuum').fetchone()[0] != 2:
+        return None
+    freed = 0
+    while True:
+        free = db.execute('PRAGMA main.freelist_count').fetchone()[0]
+        if not free:
+            break
+        step = min(free, pages)
+        # execute() робить лише один крок прагми без результату (одна сторінка); executescript — до кінця
+        db.executescript(f'PRAGMA main.incremental_vacuum({step});')
+        freed += step
+        time.sleep(pause)
+    # Файл зменшується, коли WAL переноситься в БД
+    db.execute('PRAGMA main.wal_checkpoint(PASSIVE)').fetchall()
+    return freed
+
+def enable_incremental_vacuum(db):
+    """Разове перемикання існуючої БД на auto_vacuum = INCREMENTAL (повний VACUUM, блокує запис)."""
+    db.execute('PRAGMA main.auto_vacuum = INCREMENTAL')
+    db.execute('VACUUM main')
+
+def run(db, days=RETENTION_DAYS, batch=RETENTION_BATCH, pause=RETENTION_PAUSE_MS / 1000, vacuum=True):
+    """Переносить усе старше за days днів; звіт {tables: {таблиця: {rows, seconds, rows_per_sec}}, ...}."""
+    attach(db)
+    # Рядок в архіві має пережити збій живлення до того, як його видалять з робочої БД
+    db.execute('PRAGMA archive.synchronous = FULL')
+    cutoff = cutoff_for(days)
+    report = {'cutoff': cutoff, 'tables': {}}
+    for table in ARCHIVED:
+        started = time.perf_counter()
+        totals = {}
+        while True:
+            moved = move_batch(db, table, cutoff, batch)
+            for name, count in moved.items():
+                totals[name] = totals.get(name, 0) + count
+            if moved[table] < batch:
+                break
+            time.sleep(pause)
+        seconds = time.perf_counter() - started
+        for name, count in totals.items():
+            report['tables'][name] = {'rows': count, 'seconds': round(seconds, 3),
+                                      'rows_per_sec': round(count / seconds) if seconds else 0}
+    # Без статистики архіву планувальник обирає для його половини all_* не той індекс
+    db.execute('PRAGMA analysis_limit = 1000')
+    db.execute('ANALYZE archive')
+    if vacuum:
+        started = time.perf_counter()
+        freed = incremental_vacuum(db, pause=pause)
+        report['vacuum'] = None if freed is None else {'pages': freed, 'seconds': round(time.perf_counter() - started, 3)}
+    report['size'] = {name: os.path.getsize(path) for name, path in (('main', DATABASE), ('archive', ARCHIVE_DATABASE))
+                      if os.path.exists(path)}
+    return report
+
+def _background():
+    # Переносить лише один воркер: той, що взяв flock; решта перевіряють знову через інтервал
+    lock = open(f'{ARCHIVE_DATABASE}.lock', 'a')
+    while True:
+        time.sleep(RETENTION_INTERVAL)
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            continue
+        try:
+            db = connect()
+            try:
+                run(db)
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"⚠️ Архівування не вдалося: {e}")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def start_background():
+    """Викликається у воркері gunicorn (post_fork): фоновий перенос раз на RETENTION_INTERVAL секунд."""
+    if RETENTION_INTERVAL > 0:
+        threading.Thread(target=_background, name='retention', daemon=True).start()
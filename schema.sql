@@ -3,6 +3,10 @@ DROP TABLE IF EXISTS products;
 DROP TABLE IF EXISTS feedback;
 DROP TABLE IF EXISTS orders;
 DROP TABLE IF EXISTS order_items;
+DROP TABLE IF EXISTS table_generations;
+DROP TABLE IF EXISTS carts;
+DROP TABLE IF EXISTS products_fts;
+DROP TABLE IF EXISTS feedback_fts;
 
 -- Таблиця користувачів
 CREATE TABLE users (
@@ -0,0 +1,39 @@
+import re
+
+# Повнотекстовий пошук (міграція 8): products_fts(name, category) та feedback_fts(text) —
+# external-content таблиці FTS5, які тригери синхронізують з products і feedback.
+SEARCH_TYPES = ('products', 'feedback')
+MAX_TERMS = 8
+# Слово — літери/цифри разом з апострофом усередині (п'єр, пʼєр)
+_TERM = re.compile(r"\w+(?:['ʼ’]\w+)*")
+
+def fts_query(text):
+    """Рядок користувача -> безпечний запит FTS5: кожне слово в лапках і з префіксним пошуком."""
+    terms = _TERM.findall((text or '').lower())[:MAX_TERMS]
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+def search_products(db, query, limit, cursor=None):
+    """Товари за BM25 (назва важить більше за категорію); курсор на limit + 1 рядків для split_page."""
+    return db.execute(f'''
+        SELECT p.*, bm25(products_fts, 10.0, 2.0) AS score
+        FROM products_fts JOIN products p ON p.id = products_fts.rowid
+        WHERE products_fts MATCH ?
+        {'AND (score > ? OR (score = ? AND p.id > ?))' if cursor else ''}
+        ORDER BY score, p.id LIMIT ?''',
+        (query, *((cursor[0], cursor[0], cursor[1]) if cursor else ()), limit + 1))
+
+def search_feedback(db, query, limit, cursor=None):
+    """Відгуки за BM25 з фрагментом тексту, де знайдено збіг."""
+    return db.execute(f'''
+        SELECT f.*, bm25(feedback_fts) AS score,
+               snippet(feedback_fts, 0, '[', ']', '…', 12) AS snippet
+        FROM feedback_fts JOIN feedback f ON f.id = feedback_fts.rowid
+        WHERE feedback_fts MATCH ?
+        {'AND (score > ? OR (score = ? AND f.id > ?))' if cursor else ''}
+        ORDER BY score, f.id LIMIT ?''',
+        (query, *((cursor[0], cursor[0], cursor[1]) if cursor else ()), limit + 1))
+
+def product_ids(db, query):
+    """Id усіх товарів, що відповідають запиту, від найрелевантнішого (фільтр для /shop)."""
+    return [row[0] for row in db.execute(
+        'SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY bm25(products_fts, 10.0, 2.0)', (query,))]
@@ -0,0 +1,128 @@
+import json
+import math
+import os
+import threading
+from json.encoder import encode_basestring
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # orjson необов'язковий: без нього — власний кодувальник на stdlib
+    orjson = None
+
+# Рядки SQLite -> JSON без row_factory з'єднання (колишній api.dict_factory).
+# Для кожного набору колонок один раз будується Layout: шаблон JSON-об'єкта та індекси полів.
+# Рядки читаються кортежами (row_factory вимикається лише на курсорі) і кодуються одразу в bytes:
+# без orjson значення кодуються по колонках і підставляються в шаблон. З orjson звичайні рядки
+# кодуються як dict(zip(...)) одним викликом orjson.dumps — це у 1.2–2 рази швидше за підстановку
+# кортежів у шаблон (bench/serialize_bench.py). Рядки з готовим JSON у колонці (raw) підставляються
+# в bytes-шаблон без розбору: orjson 3.8 не має Fragment, а loads + dumps повільніші.
+# JSON_BACKEND=json примусово вимикає orjson (для порівняння в bench/serialize_bench.py).
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'orjson' if orjson else 'json')
+if JSON_BACKEND == 'orjson' and orjson is None:
+    JSON_BACKEND = 'json'
+MIMETYPE = 'application/json'
+
+def _float(value):
+    # NaN/Infinity не є JSON — як і orjson, віддаємо null
+    return float.__repr__(value) if math.isfinite(value) else 'null'
+
+def _other(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+_VALUE = {str: encode_basestring, int: int.__repr__, float: _float, type(None): lambda value: 'null'}
+
+def _encode_column(values):
+    """Список JSON-рядків значень однієї колонки; типи в колонці SQLite зазвичай однакові."""
+    types = set(map(type, values))
+    if len(types) == 1:
+        return list(map(_VALUE.get(types.pop(), _other), values))
+    return [_VALUE.get(type(value), _other)(value) for value in values]
+
+def _raw(value):
+    # Колонка вже містить JSON (json_group_array тощо)
+    return 'null' if value is None else value
+
+def _raw_bytes(value):
+    return b'null' if value is None else value.encode()
+
+class Layout:
+    """Колонки результату запиту: шаблон JSON-об'єкта рядка і доступ до полів кортежу за назвою."""
+
+    def __init__(self, columns, raw=()):
+        self.columns = columns
+        self.index = {name: i for i, name in enumerate(columns)}
+        self.raw = tuple(self.index[name] for name in raw if name in self.index)
+        self._template = '{' + ','.join(f'{encode_basestring(name)}:%s' for name in columns) + '}'
+        self._bytes_template = self._template.replace('%s', '%b').encode()
+        self._dumps = [_raw_bytes if i in self.raw else orjson and orjson.dumps for i in range(len(columns))]
+
+    def key(self, *names):
+        """Функція рядок -> кортеж значень (ключ для pagination.split_page)."""
+        indexes = [self.index[name] for name in names]
+        return lambda row: tuple(row[i] for i in indexes)
+
+    def _objects(self, rows):
+        """Список JSON-об'єктів (str) для кортежів rows."""
+        if not rows:
+            return []
+        columns = [list(map(_raw, values)) if i in self.raw else _encode_column(values)
+                   for i, values in enumerate(zip(*rows))]
+        template = self._template
+        return [template % values for values in zip(*columns)]
+
+    def _dicts(self, rows):
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in rows]
+
+    def _spliced(self, rows):
+        """JSON-об'єкти (bytes) з кортежів: значення через orjson.dumps, raw-колонки як є."""
+        template, dumps = self._bytes_template, self._dumps
+        return [template % tuple(dump(value) for dump, value in zip(dumps, row)) for row in rows]
+
+    def encode(self, rows):
+        """JSON-масив об'єктів (bytes)."""
+        if JSON_BACKEND == 'orjson':
+            if self.raw:
+                return b'[' + b','.join(self._spliced(rows)) + b']'
+            return orjson.dumps(self._dicts(rows))
+        return ('[' + ','.join(self._objects(rows)) + ']').encode()
+
+    def encode_one(self, row):
+        """Один об'єкт (bytes)."""
+        return self.encode_parts([row])[0]
+
+    def encode_parts(self, rows):
+        """Окремий JSON-об'єкт (bytes) на кожен рядок — для NDJSON і потокових масивів."""
+        if JSON_BACKEND == 'orjson':
+            if self.raw:
+                return self._spliced(rows)
+            return [orjson.dumps(item) for item in self._dicts(rows)]
+        return [part.encode() for part in self._objects(rows)]
+
+_layouts = {}
+_lock = threading.Lock()
+
+def layout(cursor, raw=()):
+    """Layout для колонок курсора (будується один раз на набір колонок)."""
+    key = (tuple(column[0] for column in cursor.description), raw)
+    found = _layouts.get(key)
+    if found is None:
+        with _lock:
+            found = _layouts.setdefault(key, Layout(*key))
+    return found
+
+def fetch(cursor, raw=()):
+    """(Layout, рядки-кортежі); row_factory вимикається лише на цьому курсорі, з'єднання не змінюється."""
+    cursor.row_factory = None
+    return layout(cursor, raw), cursor.fetchall()
+
+def encode_value(value):
+    """Будь-яке значення (dict, list...) у JSON bytes тим самим бекендом."""
+    if JSON_BACKEND == 'orjson':
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+def response(body, status=200, headers=None):
+    """JSON-відповідь з уже закодованого тіла."""
+    return Response(body, status, headers, mimetype=MIMETYPE)
@@ -0,0 +1,67 @@
+import sqlite3
+import retention
+from datetime import date, datetime, timedelta, timezone
+
+# Зведені таблиці продажів (міграція 7) оновлюються тригерами на orders/order_items,
+# тому звіти читають лише готові рядки, а не сканують order_items.
+# Перенос в архів (retention.py) лише видаляє рядки з робочої БД, тож зведення не змінюються.
+# Лічильник 'sales' у table_generations змінюється лише при перебудові (для ETag).
+SORTS = ('revenue', 'units')
+DAILY_DEFAULT_DAYS = 30
+
+def rebuild_sales_stats(db):
+    """Перераховує зведені таблиці з нуля (бекфіл історичних замовлень); повертає кількість рядків."""
+    script = '''
+BEGIN IMMEDIATE;
+DELETE FROM sales_by_product;
+DELETE FROM sales_by_category;
+DELETE FROM sales_by_day;
+INSERT INTO sales_by_product (product_id, order_lines, units, revenue)
+    SELECT i.product_id, COUNT(*), SUM(i.quantity), SUM(i.quantity * COALESCE(p.price, 0))
+    FROM all_order_items i LEFT JOIN products p ON p.id = i.product_id
+    GROUP BY i.product_id;
+INSERT INTO sales_by_category (category, order_lines, units, revenue)
+    SELECT p.category, COUNT(*), SUM(i.quantity), SUM(i.quantity * p.price)
+    FROM all_order_items i JOIN products p ON p.id = i.product_id
+    GROUP BY p.category;
+INSERT INTO sales_by_day (day, orders, units, revenue)
+    SELECT d.day, d.orders, COALESCE(u.units, 0), d.revenue
+    FROM (SELECT date(created_at) AS day, COUNT(*) AS orders, SUM(total_price) AS revenue
+          FROM all_orders GROUP BY 1) d
+    LEFT JOIN (SELECT date(o.created_at) AS day, SUM(i.quantity) AS units
+               FROM all_orders o JOIN all_order_items i ON i.order_id = o.id GROUP BY 1) u ON u.day = d.day;
+UPDATE table_generations SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'sales';
+COMMIT;
+'''
+    # Разом з архівом (retention.py): зведення рахуються за всю історію.
+    # Одиниці по днях — одним групуванням: корельований підзапит на кожен день по представленнях
+    # all_* щоразу матеріалізує обидві їхні половини (час ~ дні × рядки).
+    retention.attach(db)
+    try:
+        db.executescript(script)
+    except sqlite3.Error:
+        if db.in_transaction:
+            db.rollback()
+        raise
+    return {table: db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('sales_by_product', 'sales_by_category', 'sales_by_day')}
+
+def product_stats(db, limit, sort='revenue'):
+    """Топ товарів за виручкою або кількістю: прохід індексу, O(limit)."""
+    sort = sort if sort in SORTS else 'revenue'
+    return db.execute(f'''
+        SELECT s.product_id, p.name, p.category, s.order_lines, s.units, s.revenue
+        FROM sales_by_product s LEFT JOIN products p ON p.id = s.product_id
+        ORDER BY s.{sort} DESC LIMIT ?''', (limit,))
+
+def category_stats(db):
+    return db.execute('''SELECT category, order_lines, units, revenue FROM sales_by_category
+                         ORDER BY revenue DESC, category''')
+
+def daily_stats(db, start=None, end=None):
+    """Продажі по днях у [start, end] (YYYY-MM-DD); за замовчуванням — останні DAILY_DEFAULT_DAYS днів."""
+    # created_at пишеться як CURRENT_TIMESTAMP, тобто в UTC
+    end = date.fromisoformat(end) if end else datetime.now(timezone.utc).date()
+    start = date.fromisoformat(start) if start else end - timedelta(days=DAILY_DEFAULT_DAYS - 1)
+    return db.execute('SELECT day, orders, units, revenue FROM sales_by_day WHERE day BETWEEN ? AND ? ORDER BY day',
+                      (start.isoformat(), end.isoformat()))
@@ -0,0 +1,65 @@
+import csv
+import io
+import os
+from flask import Response, request, stream_with_context
+import serialize
+
+NDJSON = 'application/x-ndjson'
+CSV = 'text/csv'
+# Скільки рядків читати з курсора за один fetchmany
+STREAM_BATCH = int(os.environ.get('STREAM_BATCH', 500))
+
+def stream_format():
+    """'ndjson' / 'json', якщо клієнт просить потокову відповідь, інакше None.
+
+    Потоковий режим вмикається через ?stream=1 (JSON-масив), ?stream=ndjson, ?stream=csv
+    або заголовок Accept: application/x-ndjson / text/csv. Пагінація при цьому не діє — це повний експорт.
+    """
+    mode = request.args.get('stream')
+    accepted = {mimetype for mimetype, _ in request.accept_mimetypes}
+    if mode == 'ndjson' or NDJSON in accepted:
+        return 'ndjson'
+    if mode == 'csv' or CSV in accepted:
+        return 'csv'
+    if mode in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+def stream_rows(cursor, fmt):
+    """Відповідь, що читає курсор порціями і віддає рядки одразу, не накопичуючи весь результат."""
+    layout = serialize.layout(cursor)
+    cursor.row_factory = None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def encode_csv(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+    def generate():
+        try:
+            if fmt == 'json':
+                yield b'['
+            elif fmt == 'csv':
+                yield encode_csv([layout.columns])
+            separator = b''
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    yield encode_csv(rows)
+                elif fmt == 'ndjson':
+                    yield b''.join(part + b'\n' for part in layout.encode_parts(rows))
+                else:
+                    yield separator + b','.join(layout.encode_parts(rows))
+                    separator = b','
+            if fmt == 'json':
+                yield b']'
+        finally:
+            cursor.close()
+
+    mimetype = {'ndjson': NDJSON, 'csv': CSV}.get(fmt, 'application/json')
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={'X-Accel-Buffering': 'no'})
@@ -0,0 +1,164 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from db import connect, get_db, transaction
+
+# Черга запису з груповим комітом (вмикається WRITE_QUEUE=1).
+# Один потік-записувач на процес виконує задачі пачками: одна транзакція і один fsync на пачку,
+# кожна задача — у власному SAVEPOINT, тож помилка однієї не скасовує інші.
+WRITE_QUEUE = os.environ.get('WRITE_QUEUE', '0') == '1'
+# Скільки чекати на наступні задачі після першої (0 — брати лише те, що вже в черзі)
+WRITE_BATCH_WINDOW_MS = float(os.environ.get('WRITE_BATCH_WINDOW_MS', 0))
+WRITE_BATCH_MAX = int(os.environ.get('WRITE_BATCH_MAX', 256))
+WRITE_QUEUE_MAX = int(os.environ.get('WRITE_QUEUE_MAX', 10000))
+WRITE_TIMEOUT = float(os.environ.get('WRITE_TIMEOUT', 10))
+# Відповідь віддається лише після COMMIT; FULL — fsync журналу на кожну пачку (довговічність)
+WRITE_SYNCHRONOUS = os.environ.get('WRITE_SYNCHRONOUS', 'FULL')
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class QueueFull(Exception):
+    """Черга запису переповнена або задача не встигла почати виконуватись."""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Сервер перевантажений записами, спробуйте пізніше.')
+        self.status = 503
+        self.retry_after = retry_after
+
+class WriteQueue:
+    """Черга задач fn(db, *args) -> результат; результат повертається після коміту пачки."""
+
+    def __init__(self, window_ms=WRITE_BATCH_WINDOW_MS, batch_max=WRITE_BATCH_MAX, max_size=WRITE_QUEUE_MAX):
+        self.window = window_ms / 1000
+        self.batch_max = batch_max
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _reset(self):
+        # Після fork потік-записувач батьківського процесу не існує — стартуємо свій
+        self._pid = os.getpid()
+        self._queue = queue.Queue(self.max_size)
+        self._thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+        self.jobs = self.batches = self.failed = self.commit_failures = 0
+        self.commit_seconds = 0.0
+        self.batch_max_seen = self.queue_high_water = 0
+        self.batch_sizes = [0] * (len(BATCH_BUCKETS) + 1)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+        future = Future()
+        try:
+            self._queue.put_nowait((future, fn, args))
+        except queue.Full:
+            raise QueueFull()
+        self.queue_high_water = max(self.queue_high_water, self._queue.qsize())
+        return future
+
+    def run(self, fn, *args, timeout=WRITE_TIMEOUT):
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Ще не почалась — скасовуємо; вже виконується — чекаємо, щоб не відповісти раніше за коміт
+            if future.cancel():
+                raise QueueFull()
+            return future.result()
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.batch_max and batch[-1] is not None:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        db = connect()
+        db.execute(f'PRAGMA synchronous = {WRITE_SYNCHRONOUS}')
+        while True:
+            batch = self._take_batch()
+            stop = batch[-1] is None
+            jobs = [job for job in batch if job is not None and job[0].set_running_or_notify_cancel()]
+            if jobs:
+                self._commit(db, jobs)
+            if stop:
+                db.close()
+                return
+
+    def _commit(self, db, jobs):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for future, fn, args in jobs:
+                db.execute('SAVEPOINT job')
+                try:
+                    outcomes.append((future, True, fn(db, *args)))
+                except Exception as e:
+                    db.execute('ROLLBACK TO job')
+                    outcomes.append((future, False, e))
+                db.execute('RELEASE job')
+            db.commit()
+        except Exception as e:
+            if db.in_transaction:
+                db.rollback()
+            self.commit_failures += 1
+            outcomes = [(future, False, e) for future, _, _ in jobs]
+        elapsed = time.perf_counter() - started
+        size = len(jobs)
+        self.jobs += size
+        self.batches += 1
+        self.commit_seconds += elapsed
+        self.batch_max_seen = max(self.batch_max_seen, size)
+        self.batch_sizes[next((i for i, bound in enumerate(BATCH_BUCKETS) if size <= bound), -1)] += 1
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                self.failed += 1
+                future.set_exception(value)
+
+    def stats(self):
+        if self._pid != os.getpid():
+            return {}
+        return {'jobs': self.jobs, 'batches': self.batches, 'failed': self.failed,
+                'commit_failures': self.commit_failures, 'commit_seconds': round(self.commit_seconds, 6),
+                'queue_depth': self._queue.qsize(), 'queue_high_water': self.queue_high_water,
+                'batch_max': self.batch_max_seen,
+                'batch_sizes': dict(zip([str(bound) for bound in BATCH_BUCKETS] + ['+Inf'], self.batch_sizes))}
+
+    def close(self, timeout=5):
+        """Дописує вже поставлені задачі й зупиняє потік (при завершенні процесу)."""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+write_queue = WriteQueue()
+atexit.register(write_queue.close)
+
+def write(fn, *args):
+    """Виконує fn(db, *args) у транзакції та повертає результат лише після коміту.
+
+    З WRITE_QUEUE=1 — через спільну чергу з груповим комітом, інакше — одразу на з'єднанні запиту.
+    """
+    if WRITE_QUEUE:
+        return write_queue.run(fn, *args)
+    with transaction(get_db(readonly=False)) as db:
+        return fn(db, *args)
+
+def stats():
+    return write_queue.stats() if WRITE_QUEUE else {}
+
+def init_app(app):
+    @app.errorhandler(QueueFull)
+    def handle_queue_full(e):
+        return e.args[0], e.status, {'Retry-After': str(e.retry_after), 'Content-Type': 'text/plain; charset=utf-8'}